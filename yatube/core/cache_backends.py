@@ -0,0 +1,397 @@
+"""
+Двухуровневый кэш: память процесса поверх общего кэша.
+
+Общий кэш (LOCATION — имя другого кэша из CACHES) видят все
+обработчики, а горячие ключи — версии лент, метаданные групп,
+имена авторов — читаются из ограниченного LRU в памяти процесса и живут
+там не дольше LOCAL_TIMEOUT секунд.
+
+Изменение ключа, которое другие процессы должны увидеть сразу — delete,
+incr/decr (так сдвигаются версии кэша) и clear, — рассылается через
+общий кэш: счётчик поколений растёт, а под номером поколения лежит
+сброшенный ключ. Каждый процесс не чаще раза в BROADCAST_INTERVAL секунд
+сверяет поколение и выбрасывает из памяти сброшенные ключи; если
+пропущено слишком много поколений, очищает память целиком. Обычный
+set() не рассылается: остальные процессы увидят новое значение не
+позже чем через LOCAL_TIMEOUT секунд.
+
+На add() и incr() общего кэша держатся блокировки core.stampede, версии
+кэша и сам счётчик поколений, поэтому они должны быть атомарными, как в
+AtomicDatabaseCache (у файлового кэша это чтение и запись по очереди).
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Q
+
+GENERATION_KEY = "two-tier:generation"
+# Под этим значением в рассылке — «очистить всё».
+CLEAR_ALL = "*"
+# Сколько последних поколений можно дочитать по одному, а не очищая всё.
+MAX_GENERATION_GAP = 100
+
+_MISSING = object()
+# Память общая для всех потоков процесса, как у LocMemCache.
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """LRU в памяти процесса: ключ -> (pickle значения, срок)."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.checked = 0.0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            pickled, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return _MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def put(self, key, value, timeout, max_entries):
+        if timeout <= 0:
+            self.discard(key)
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (pickled, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.shared_alias = location
+        self.local_timeout = float(options.get("LOCAL_TIMEOUT", 5))
+        self.broadcast_interval = float(options.get("BROADCAST_INTERVAL", 1))
+        with _tiers_lock:
+            self.local = _tiers.setdefault(location, LocalTier())
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _remember(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.local.put(
+            key, value, self._local_timeout(timeout), self._max_entries
+        )
+
+    def sync(self, force=False):
+        """Применяет рассылку других процессов: сбрасывает их ключи."""
+        local = self.local
+        now = time.monotonic()
+        if not force and now - local.checked < self.broadcast_interval:
+            return
+        local.checked = now
+        generation = self.shared.get(GENERATION_KEY)
+        seen = local.generation
+        if generation == seen:
+            return
+        local.generation = generation
+        if (
+            seen is None
+            or generation is None
+            or not 0 < generation - seen <= MAX_GENERATION_GAP
+        ):
+            local.clear()
+            return
+        names = [
+            self._broadcast_key(number)
+            for number in range(seen + 1, generation + 1)
+        ]
+        dropped = self.shared.get_many(names)
+        if len(dropped) < len(names) or CLEAR_ALL in dropped.values():
+            local.clear()
+        else:
+            local.discard(*dropped.values())
+
+    def _broadcast_key(self, generation):
+        return f"two-tier:dropped:{generation}"
+
+    def _broadcast(self, key):
+        """Сообщает другим процессам, что key в их памяти устарел."""
+        shared = self.shared
+        shared.add(GENERATION_KEY, 0, None)
+        try:
+            generation = shared.incr(GENERATION_KEY)
+        except ValueError:
+            # Счётчик вытеснили между add() и incr().
+            shared.set(GENERATION_KEY, 0, None)
+            generation = 0
+        shared.set(
+            self._broadcast_key(generation),
+            key,
+            max(self.local_timeout, self.broadcast_interval) * 10,
+        )
+        local = self.local
+        # Своё изменение уже применено; чужие поколения между ними
+        # дочитает следующий sync().
+        if local.generation is not None and generation == local.generation + 1:
+            local.generation = generation
+
+    def get(self, key, default=None, version=None):
+        self.sync()
+        local_key = self.make_key(key, version)
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        self._remember(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.sync()
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(self.make_key(key, version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            fetched = self.shared.get_many(missing, version)
+            for key, value in fetched.items():
+                self._remember(self.make_key(key, version), value)
+            found.update(fetched)
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._remember(self.make_key(key, version), value, timeout)
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._remember(self.make_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            if key not in failed:
+                self._remember(self.make_key(key, version), value, timeout)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_key(key, version)
+        self.shared.delete(key, version)
+        self.local.discard(local_key)
+        self._broadcast(local_key)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_key(key, version)
+        value = self.shared.incr(key, delta, version)
+        self.local.discard(local_key)
+        self._broadcast(local_key)
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version) is not _MISSING
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+        self._broadcast(CLEAR_ALL)
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class AtomicDatabaseCache(BaseCache):
+    """
+    Кэш в таблице core.CacheEntry базы LOCATION (по умолчанию default).
+
+    add() — INSERT, который проигрывает параллельному по первичному
+    ключу, incr() — UPDATE ... SET number = number + delta: ни то, ни
+    другое не теряет параллельных изменений. Запросы идут в базу напрямую,
+    мимо роутера: запись в кэш не закрепляет пользователя за основной
+    базой, а чтение не уходит на отстающую реплику.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.using = location or DEFAULT_DB_ALIAS
+
+    @property
+    def entries(self):
+        from .models import CacheEntry
+
+        return CacheEntry.objects.using(self.using)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def _live(self):
+        return self.entries.filter(
+            Q(expires__isnull=True) | Q(expires__gt=time.time())
+        )
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int:
+            return {"value": None, "number": value}
+        return {
+            "value": pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            "number": None,
+        }
+
+    @staticmethod
+    def _decode(pickled, number):
+        if pickled is None:
+            return number
+        return pickle.loads(pickled)
+
+    def get(self, key, default=None, version=None):
+        row = (
+            self._live()
+            .filter(key=self._key(key, version))
+            .values_list("value", "number")
+            .first()
+        )
+        if row is None:
+            return default
+        return self._decode(*row)
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        rows = self._live().filter(key__in=names)
+        return {
+            names[name]: self._decode(pickled, number)
+            for name, pickled, number in rows.values_list(
+                "key", "value", "number"
+            )
+        }
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        # Истёкшая запись не мешает: её место займёт один из добавляющих.
+        self.entries.filter(key=key, expires__lte=time.time()).delete()
+        try:
+            with transaction.atomic(using=self.using):
+                self.entries.create(
+                    key=key,
+                    expires=self.get_backend_timeout(timeout),
+                    **self._encode(value),
+                )
+        except IntegrityError:
+            return False
+        self._cull()
+        return True
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        fields = self._encode(value)
+        fields["expires"] = self.get_backend_timeout(timeout)
+        if self.entries.filter(key=key).update(**fields):
+            return
+        try:
+            with transaction.atomic(using=self.using):
+                self.entries.create(key=key, **fields)
+        except IntegrityError:
+            # Запись успел создать параллельный запрос.
+            self.entries.filter(key=key).update(**fields)
+        self._cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        updated = (
+            self._live()
+            .filter(key=self._key(key, version))
+            .update(expires=self.get_backend_timeout(timeout))
+        )
+        return bool(updated)
+
+    def incr(self, key, delta=1, version=None):
+        name = self._key(key, version)
+        # UPDATE держит блокировку строки (в SQLite — всей базы) до конца
+        # транзакции, поэтому SELECT видит именно своё значение.
+        with transaction.atomic(using=self.using):
+            entry = self._live().filter(key=name, number__isnull=False)
+            if not entry.update(number=F("number") + delta):
+                raise ValueError(f"Key '{key}' not found")
+            return entry.values_list("number", flat=True).get()
+
+    def delete(self, key, version=None):
+        self.entries.filter(key=self._key(key, version)).delete()
+
+    def delete_many(self, keys, version=None):
+        names = [self._key(key, version) for key in keys]
+        self.entries.filter(key__in=names).delete()
+
+    def has_key(self, key, version=None):
+        return self._live().filter(key=self._key(key, version)).exists()
+
+    def clear(self):
+        self.entries.all().delete()
+
+    def _cull(self):
+        """Вызывается после вставки: держит таблицу в MAX_ENTRIES."""
+        entries = self.entries
+        if entries.count() <= self._max_entries:
+            return
+        entries.filter(expires__lte=time.time()).delete()
+        count = entries.count()
+        if count <= self._max_entries:
+            return
+        if not self._cull_frequency:
+            entries.all().delete()
+            return
+        # Первыми уходят записи, которые и так скоро истекут; бессрочные
+        # (счётчики версий) — последними.
+        victims = entries.order_by(F("expires").asc(nulls_last=True))
+        keys = list(
+            victims.values_list("key", flat=True)[
+                : count // self._cull_frequency
+            ]
+        )
+        entries.filter(key__in=keys).delete()
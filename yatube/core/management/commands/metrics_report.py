@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.metrics import FIELDS, published_samples, summarize
+
+
+class Command(BaseCommand):
+    help = "Показывает перцентили времени и числа запросов по представлениям."
+
+    def handle(self, *args, **options):
+        summary = summarize(published_samples())
+        if not summary:
+            self.stdout.write("Замеров пока нет.")
+            return
+        header = f"{'view':<28}{'count':>7}" + "".join(
+            f"{field + ' p50/p95/p99':>30}" for field in FIELDS
+        )
+        self.stdout.write(header)
+        for view_name, row in summary.items():
+            cells = "".join(
+                "{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}".format(**row[field])
+                for field in FIELDS
+            )
+            self.stdout.write(f"{view_name:<28}{row['count']:>7}{cells}")
@@ -0,0 +1,63 @@
+import signal
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = "Выполняет задачи из очереди пулом потоков с повторами."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads", type=int, default=4, help="Размер пула потоков."
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах, когда очередь пуста.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить готовые задачи и выйти.",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        worker_id = uuid.uuid4().hex
+        threads = options["threads"]
+        done = failed = 0
+        tasks.schedule_periodic()
+        with ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="worker"
+        ) as pool:
+            while not self.stopping:
+                close_old_connections()
+                batch = tasks.claim(threads, worker_id)
+                if not batch:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                for ok in pool.map(self.run_task, batch):
+                    done += ok
+                    failed += not ok
+                self.stdout.write(f"Выполнено: {done}, с ошибкой: {failed}")
+        self.stdout.write(self.style.SUCCESS("Обработчик остановлен."))
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    @staticmethod
+    def run_task(task_obj):
+        try:
+            return tasks.execute(task_obj)
+        finally:
+            connection.close()
@@ -0,0 +1,165 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+    "queries",
+    "sql_ms",
+    "cache_queries",
+    "cache_ms",
+    "template_ms",
+    "wall_ms",
+)
+PIDS_KEY = "core:metrics:pids"
+PUBLISH_TIMEOUT = 60 * 60
+
+_local = threading.local()
+
+
+class RequestStats:
+    """
+    Счётчики одного запроса: SQL и время рендера шаблонов.
+
+    Общий кэш живёт в таблице core.CacheEntry, и его запросы считаются
+    отдельно, чтобы queries и sql_ms показывали работу самого
+    представления.
+    """
+
+    def __init__(self):
+        from .models import CacheEntry
+
+        self.cache_table = CacheEntry._meta.db_table
+        self.queries = 0
+        self.sql_time = 0.0
+        self.cache_queries = 0
+        self.cache_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.cache_table in sql:
+                self.cache_queries += 1
+                self.cache_time += elapsed
+            else:
+                self.queries += 1
+                self.sql_time += elapsed
+
+
+def start_request():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish_request():
+    _local.stats = None
+
+
+def current():
+    return getattr(_local, "stats", None)
+
+
+def percentile(values, fraction):
+    """Перцентиль методом ближайшего ранга."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples):
+    """Сводка по представлениям: p50/p95/p99/max для каждой метрики."""
+    summary = {}
+    for view_name, rows in sorted(samples.items()):
+        columns = dict(zip(FIELDS, zip(*rows))) if rows else {}
+        summary[view_name] = {"count": len(rows)}
+        for field in FIELDS:
+            values = columns.get(field, ())
+            summary[view_name][field] = {
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+                "max": max(values, default=0),
+            }
+    return summary
+
+
+class Recorder:
+    """Кольцевой буфер последних замеров по каждому представлению."""
+
+    def __init__(self, size):
+        self.size = size
+        self._samples = defaultdict(lambda: deque(maxlen=self.size))
+        self._lock = threading.Lock()
+        self._recorded = 0
+
+    def record(self, view_name, sample):
+        with self._lock:
+            self._samples[view_name].append(
+                tuple(sample[field] for field in FIELDS)
+            )
+            self._recorded += 1
+            publish = self._recorded % settings.METRICS_PUBLISH_EVERY == 0
+        if publish:
+            self.publish()
+
+    def samples(self):
+        with self._lock:
+            return {name: list(rows) for name, rows in self._samples.items()}
+
+    def summary(self):
+        return summarize(self.samples())
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def publish(self):
+        """Кладёт замеры процесса в кэш, чтобы их видела команда отчёта."""
+        pid = os.getpid()
+        cache.set(f"core:metrics:{pid}", self.samples(), PUBLISH_TIMEOUT)
+        pids = set(cache.get(PIDS_KEY, ()))
+        if pid not in pids:
+            cache.set(PIDS_KEY, pids | {pid}, PUBLISH_TIMEOUT)
+
+
+def published_samples():
+    """Замеры всех процессов, опубликованные в общий кэш."""
+    merged = defaultdict(list)
+    for pid in cache.get(PIDS_KEY, ()):
+        for view_name, rows in (
+            cache.get(f"core:metrics:{pid}") or {}
+        ).items():
+            merged[view_name].extend(rows)
+    return dict(merged)
+
+
+def check_budget(view_name, sample):
+    budget = settings.METRICS_BUDGETS.get(view_name)
+    if not budget:
+        return
+    exceeded = [
+        f"{field}={sample[field]:.1f} > {limit}"
+        for field, limit in budget.items()
+        if sample.get(field, 0) > limit
+    ]
+    if exceeded:
+        logger.warning(
+            "Превышен бюджет %s: %s", view_name, ", ".join(exceeded)
+        )
+
+
+recorder = Recorder(settings.METRICS_BUFFER_SIZE)
@@ -0,0 +1,82 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+
+PIN_COOKIE = "primary_pin"
+
+
+class RequestMetricsMiddleware:
+    """Замеряет SQL, шаблоны и общее время запроса по имени представления."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        stats = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.sql_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.finish_request()
+        wall_time = time.perf_counter() - start
+
+        match = request.resolver_match
+        if match is not None:
+            sample = {
+                "queries": stats.queries,
+                "sql_ms": stats.sql_time * 1000,
+                "cache_queries": stats.cache_queries,
+                "cache_ms": stats.cache_time * 1000,
+                "template_ms": stats.template_time * 1000,
+                "wall_ms": wall_time * 1000,
+            }
+            metrics.recorder.record(match.view_name, sample)
+            metrics.check_budget(match.view_name, sample)
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Закрепляет пользователя за основной базой на REPLICA_PIN_SECONDS после
+    записи, чтобы он сразу видел свой пост, даже если реплика отстаёт.
+
+    Отметка хранится в cookie, а не в сессии: сессию тоже читают через
+    роутер, а cookie одинаково работает при любом числе процессов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        routers.reset(
+            pinned=PIN_COOKIE in request.COOKIES
+            or request.method not in ("GET", "HEAD", "OPTIONS")
+        )
+        try:
+            response = self.get_response(request)
+            if routers.wrote():
+                response.set_cookie(
+                    PIN_COOKIE,
+                    "1",
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True,
+                    samesite="Lax",
+                )
+        finally:
+            routers.reset()
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_task"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CacheEntry",
+            fields=[
+                (
+                    "key",
+                    models.CharField(
+                        max_length=255, primary_key=True, serialize=False
+                    ),
+                ),
+                ("value", models.BinaryField(null=True)),
+                ("number", models.BigIntegerField(null=True)),
+                ("expires", models.FloatField(db_index=True, null=True)),
+            ],
+            options={
+                "verbose_name": "Запись кэша",
+                "verbose_name_plural": "Записи кэша",
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# core/models.py
+from django.db import models
+
+
+class Task(models.Model):
+    """Отложенная задача: путь к функции и её аргументы в JSON."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (FAILED, "Ошибка"),
+    )
+
+    name = models.CharField(max_length=200, verbose_name="Функция")
+    arguments = models.TextField(default="[]", verbose_name="Аргументы")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name="Статус",
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(
+        default=5, verbose_name="Попыток всего"
+    )
+    run_at = models.DateTimeField(verbose_name="Запустить после")
+    locked_by = models.CharField(
+        max_length=64, blank=True, verbose_name="Обработчик"
+    )
+    locked_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Взята в работу"
+    )
+    last_error = models.TextField(blank=True, verbose_name="Ошибка")
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name="Поставлена"
+    )
+
+    class Meta:
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        # Обработчик выбирает задачи по статусу и времени запуска.
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="task_due"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.status}]"
+
+
+class CacheEntry(models.Model):
+    """
+    Запись общего кэша (core.cache_backends.AtomicDatabaseCache).
+
+    Целые числа лежат в number, чтобы incr() был одним UPDATE; остальные
+    значения — pickle в value.
+    """
+
+    key = models.CharField(max_length=255, primary_key=True)
+    value = models.BinaryField(null=True)
+    number = models.BigIntegerField(null=True)
+    # Unix-время истечения; None — бессрочно.
+    expires = models.FloatField(null=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Запись кэша"
+        verbose_name_plural = "Записи кэша"
+
+    def __str__(self):
+        return self.key
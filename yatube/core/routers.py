@@ -0,0 +1,64 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_local = threading.local()
+
+
+def reset(pinned=False):
+    """Начинает новый запрос: с закреплением за основной базой или без."""
+    _local.pinned = pinned
+    _local.wrote = False
+
+
+def wrote():
+    return getattr(_local, "wrote", False)
+
+
+def pinned():
+    return getattr(_local, "pinned", False) or wrote()
+
+
+@contextmanager
+def primary():
+    """Чтение внутри блока идёт в основную базу."""
+    previous = getattr(_local, "pinned", False)
+    _local.pinned = True
+    try:
+        yield
+    finally:
+        _local.pinned = previous
+
+
+class ReplicaRouter:
+    """
+    Запись — в основную базу, чтение — в случайную реплику.
+
+    Чтение остаётся на основной базе, если в этом запросе уже была запись,
+    если пользователь недавно писал (см. ReplicaPinMiddleware), если
+    открыта транзакция (реплика не видит незакоммиченных изменений) или
+    внутри primary(): так считаются значения для кэша.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            not replicas
+            or pinned()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,87 @@
+"""
+Кэш без «давки» на истёкших ключах.
+
+get_or_set() — замена cache.get_or_set() для горячих ключей. Значение
+хранится вместе со сроком свежести и временем, за которое оно было
+посчитано:
+
+* пока значение свежее, оно отдаётся сразу, но чем ближе конец срока
+  и чем дороже расчёт, тем вероятнее запрос пересчитает его заранее
+  (вероятностное раннее обновление, XFetch);
+* после срока свежести значение ещё CACHE_STALE_TIMEOUT секунд лежит в
+  кэше: пересчитывает его один запрос, взявший короткую блокировку
+  (cache.add), остальные получают старое значение;
+* если значения нет совсем (первый запрос или новая версия ключа),
+  считает тоже один запрос, а остальные ждут его результат до
+  CACHE_LOCK_TIMEOUT секунд и только потом считают сами.
+
+Значение считается по основной базе: версию ключа сдвигают после
+коммита в неё, и отстающая реплика положила бы под новой версией старые
+данные.
+"""
+
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import routers
+
+# Как часто ожидающий запрос проверяет, не появилось ли значение.
+POLL_INTERVAL = 0.05
+
+
+def lock_key(key):
+    return f"{key}:lock"
+
+
+def get_or_set(key, compute, timeout, beta=1.0):
+    """Значение key из кэша или compute(), посчитанное одним запросом."""
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until, cost = entry
+        # -log(u) при u из (0, 1] — экспоненциальная случайная величина:
+        # обычно мала, поэтому раннее обновление случается редко и
+        # только у одного из многих запросов.
+        early = cost * beta * -math.log(1.0 - random.random())
+        if time.time() + early < fresh_until:
+            return value
+        if not cache.add(lock_key(key), 1, settings.CACHE_LOCK_TIMEOUT):
+            # Пересчитывает другой запрос: отдаём то, что есть.
+            return value
+        return _refresh(key, compute, timeout)
+
+    if cache.add(lock_key(key), 1, settings.CACHE_LOCK_TIMEOUT):
+        return _refresh(key, compute, timeout)
+    deadline = time.time() + settings.CACHE_LOCK_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if cache.get(lock_key(key)) is None:
+            # Владелец блокировки упал, не записав значение.
+            break
+    return _store(key, compute, timeout)
+
+
+def _refresh(key, compute, timeout):
+    try:
+        return _store(key, compute, timeout)
+    finally:
+        cache.delete(lock_key(key))
+
+
+def _store(key, compute, timeout):
+    start = time.time()
+    with routers.primary():
+        value = compute()
+    now = time.time()
+    cache.set(
+        key,
+        (value, now + timeout, now - start),
+        timeout + settings.CACHE_STALE_TIMEOUT,
+    )
+    return value
@@ -0,0 +1,144 @@
+"""
+Очередь отложенных задач в таблице базы данных.
+
+Задача — функция, помеченная декоратором @task, и JSON-аргументы.
+enqueue() только вставляет строку, поэтому задача становится видна
+обработчику вместе с коммитом запроса, который её поставил. Выполняет
+задачи команда run_worker, она же ставит в очередь периодические задачи
+из TASKS_PERIODIC; при TASKS_EAGER задачи выполняются сразу
+после коммита в том же процессе (удобно в тестах и при разработке).
+"""
+
+import json
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+def task(func):
+    """Разрешает обработчику вызывать функцию по её пути."""
+    func.is_task = True
+    func.path = f"{func.__module__}.{func.__qualname__}"
+    return func
+
+
+def enqueue(func, *args, delay=0, max_attempts=None):
+    if not getattr(func, "is_task", False):
+        raise ValueError(f"{func!r} не помечена декоратором @task.")
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: _run_eagerly(func, args))
+        return None
+    return Task.objects.create(
+        name=func.path,
+        arguments=json.dumps(args),
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.TASKS_MAX_ATTEMPTS,
+    )
+
+
+def _run_eagerly(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Задача %s упала", func.path)
+
+
+def claim(limit, worker_id=None):
+    """
+    Забирает до limit готовых к запуску задач. Зависшие в RUNNING дольше
+    TASKS_LEASE секунд (обработчик упал) считаются снова свободными.
+    """
+    worker_id = worker_id or uuid.uuid4().hex
+    now = timezone.now()
+    due = Q(status=Task.PENDING, run_at__lte=now) | Q(
+        status=Task.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.TASKS_LEASE),
+    )
+    ids = list(
+        Task.objects.filter(due)
+        .order_by("run_at", "id")
+        .values_list("id", flat=True)[:limit]
+    )
+    # Условие повторяется в UPDATE: из двух обработчиков задачу получит
+    # тот, чей UPDATE выполнится первым.
+    Task.objects.filter(due, id__in=ids).update(
+        status=Task.RUNNING, locked_by=worker_id, locked_at=now
+    )
+    return list(
+        Task.objects.filter(
+            id__in=ids, status=Task.RUNNING, locked_by=worker_id
+        )
+    )
+
+
+def backoff(attempts):
+    """Пауза перед следующей попыткой: экспонента с потолком."""
+    return min(
+        settings.TASKS_BACKOFF * 2 ** (attempts - 1),
+        settings.TASKS_BACKOFF_MAX,
+    )
+
+
+def execute(task_obj):
+    """Выполняет задачу и возвращает успех; упавшую откладывает."""
+    attempts = task_obj.attempts + 1
+    try:
+        func = import_string(task_obj.name)
+        if not getattr(func, "is_task", False):
+            raise ImportError(f"{task_obj.name} не помечена как задача.")
+        func(*json.loads(task_obj.arguments))
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Задача %s упала", task_obj)
+        if attempts >= task_obj.max_attempts:
+            changes = {"status": Task.FAILED}
+        else:
+            changes = {
+                "status": Task.PENDING,
+                "run_at": timezone.now()
+                + timedelta(seconds=backoff(attempts)),
+            }
+        Task.objects.filter(pk=task_obj.pk).update(
+            attempts=attempts, last_error=error, locked_by="", **changes
+        )
+        if changes["status"] == Task.FAILED:
+            _repeat(task_obj.name)
+        return False
+    # Выполненные задачи не копятся: в таблице остаются только ошибки.
+    Task.objects.filter(pk=task_obj.pk).delete()
+    _repeat(task_obj.name)
+    return True
+
+
+def _repeat(name):
+    interval = settings.TASKS_PERIODIC.get(name)
+    if interval is not None:
+        enqueue(import_string(name), delay=interval)
+
+
+def schedule_periodic():
+    """Ставит в очередь периодические задачи, которых в ней ещё нет."""
+    waiting = Task.objects.filter(
+        status__in=(Task.PENDING, Task.RUNNING)
+    ).values_list("name", flat=True)
+    missing = set(settings.TASKS_PERIODIC) - set(
+        waiting.filter(name__in=settings.TASKS_PERIODIC)
+    )
+    for name in sorted(missing):
+        enqueue(import_string(name))
+
+
+def run_pending(limit=100):
+    """Выполняет готовые задачи в текущем потоке; для тестов и отладки."""
+    return [execute(task_obj) for task_obj in claim(limit)]
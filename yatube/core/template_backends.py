@@ -0,0 +1,37 @@
+import time
+
+from django.template.backends.django import DjangoTemplates
+
+from . import metrics
+
+
+class MeteredTemplate:
+    """Шаблон, который сообщает время рендера в метрики запроса."""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        stats = metrics.current()
+        if stats is None:
+            return self._template.render(context, request)
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats.template_depth -= 1
+            # Вложенный рендер уже учтён во времени внешнего шаблона.
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - start
+
+
+class MeteredDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return MeteredTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return MeteredTemplate(super().get_template(template_name))
@@ -1,7 +1,51 @@
-# core/tests.py
+import os
+import shutil
+import tempfile
+import threading
+import time
 from http import HTTPStatus
+from io import StringIO
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import routers, stampede, tasks
+from .cache_backends import AtomicDatabaseCache, LocalTier, TwoTierCache
+from .metrics import percentile, recorder
+from .middleware import PIN_COOKIE, ReplicaPinMiddleware
+from .models import CacheEntry, Task
+
+User = get_user_model()
+
+CALLS = []
+
+
+@tasks.task
+def remember(value):
+    CALLS.append(value)
+
+
+@tasks.task
+def explode():
+    raise RuntimeError("Ошибка задачи")
+
+
+@tasks.task
+def tick():
+    CALLS.append("tick")
 
 
 class ViewTestClass(TestCase):
@@ -9,3 +53,408 @@ class ViewTestClass(TestCase):
         response = self.client.get("/nonexist-page/")
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND.value)
         self.assertTemplateUsed(response, "core/404.html")
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        recorder.clear()
+
+    def test_request_is_recorded_by_view_name(self):
+        """Запрос попадает в буфер под именем представления."""
+        self.client.get(reverse("posts:index"))
+        summary = recorder.summary()["posts:index"]
+        self.assertEqual(summary["count"], 1)
+        self.assertGreater(summary["queries"]["max"], 0)
+        self.assertGreater(summary["template_ms"]["max"], 0)
+        self.assertGreaterEqual(
+            summary["wall_ms"]["max"], summary["template_ms"]["max"]
+        )
+
+    def test_cache_queries_are_counted_separately(self):
+        """Запросы к таблице кэша не попадают в queries представления."""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as context:
+            self.client.get(reverse("posts:index"))
+        cache_table = CacheEntry._meta.db_table
+        cached = [q for q in context if cache_table in q["sql"]]
+        summary = recorder.summary()["posts:index"]
+        self.assertGreater(summary["cache_queries"]["max"], 0)
+        self.assertEqual(summary["cache_queries"]["max"], len(cached))
+        self.assertEqual(summary["queries"]["max"], len(context) - len(cached))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0)
+
+    @override_settings(METRICS_BUDGETS={"posts:index": {"queries": 0}})
+    def test_budget_overrun_is_logged(self):
+        with self.assertLogs("core.metrics", level="WARNING"):
+            self.client.get(reverse("posts:index"))
+
+    def test_metrics_endpoint_is_staff_only(self):
+        response = self.client.get(reverse("core:metrics"))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND.value)
+        self.client.force_login(RequestMetricsTests.staff)
+        response = self.client.get(reverse("core:metrics"))
+        self.assertEqual(response.status_code, HTTPStatus.OK.value)
+        self.assertIn("core:metrics", response.json())
+
+    @override_settings(METRICS_PUBLISH_EVERY=1)
+    def test_metrics_report_reads_published_samples(self):
+        self.client.get(reverse("posts:index"))
+        out = StringIO()
+        call_command("metrics_report", stdout=out)
+        self.assertIn("posts:index", out.getvalue())
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers.reset()
+        self.addCleanup(routers.reset)
+
+    def read_db(self, request):
+        """Представление-заглушка: куда ушло бы чтение постов."""
+        return HttpResponse(self.router.db_for_read(None))
+
+    def write_db(self, request):
+        return HttpResponse(self.router.db_for_write(None))
+
+    def test_reads_go_to_replica_until_write(self):
+        self.assertEqual(self.router.db_for_read(None), "replica")
+        self.assertEqual(self.router.db_for_write(None), "default")
+        self.assertEqual(self.router.db_for_read(None), "default")
+
+    def test_user_is_pinned_to_primary_after_write(self):
+        """После записи cookie держит чтение на основной базе."""
+        factory = RequestFactory()
+        response = ReplicaPinMiddleware(self.write_db)(factory.post("/"))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = factory.get("/")
+        self.assertEqual(
+            ReplicaPinMiddleware(self.read_db)(request).content, b"replica"
+        )
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        response = ReplicaPinMiddleware(self.read_db)(request)
+        self.assertEqual(response.content, b"default")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Запросы через настоящую вторую базу: реплика — зеркало тестовой базы
+    (TEST MIRROR), поэтому видит всё, что закоммичено в основную.
+    """
+
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases["replica"] = dict(
+            connections[DEFAULT_DB_ALIAS].settings_dict,
+            TEST={"MIRROR": DEFAULT_DB_ALIAS},
+        )
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections.databases["replica"]
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.addCleanup(routers.reset)
+
+    def create_task(self, request):
+        Task.objects.create(name="core.tests.remember", run_at=timezone.now())
+        return HttpResponse(Task.objects.count())
+
+    def count_tasks(self, request):
+        return HttpResponse(Task.objects.count())
+
+    def run_view(self, view, request):
+        """Ответ и запросы, ушедшие в основную базу и в реплику."""
+        primary = CaptureQueriesContext(connections[DEFAULT_DB_ALIAS])
+        replica = CaptureQueriesContext(connections["replica"])
+        with primary, replica:
+            response = ReplicaPinMiddleware(view)(request)
+        return response, len(primary), len(replica)
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        Task.objects.create(name="core.tests.remember", run_at=timezone.now())
+        routers.reset()
+        response, primary, replica = self.run_view(
+            self.count_tasks, self.factory.get("/")
+        )
+        self.assertEqual(response.content, b"1")
+        self.assertEqual((primary, replica), (0, 1))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_cache_is_filled_from_primary(self):
+        """Под новой версией ключа не окажутся данные отстающей реплики."""
+        cache.clear()
+        routers.reset()
+        replica = CaptureQueriesContext(connections["replica"])
+        with replica:
+            count = stampede.get_or_set("tasks:count", Task.objects.count, 60)
+        self.assertEqual(count, 0)
+        self.assertEqual(len(replica), 0)
+        self.assertFalse(routers.pinned())
+
+    def test_reads_after_write_stay_on_primary(self):
+        """Свою запись видно сразу: и в том же запросе, и по cookie."""
+        response, primary, replica = self.run_view(
+            self.create_task, self.factory.get("/")
+        )
+        self.assertEqual(response.content, b"1")
+        self.assertEqual((primary, replica), (2, 0))
+
+        request = self.factory.get("/")
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        response, primary, replica = self.run_view(self.count_tasks, request)
+        self.assertEqual(response.content, b"1")
+        self.assertEqual((primary, replica), (1, 0))
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+)
+class StampedeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_fresh_value_is_computed_once(self):
+        self.assertEqual(stampede.get_or_set("key", self.compute, 60), 1)
+        self.assertEqual(stampede.get_or_set("key", self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        cache.set("key", ("старое", time.time() - 1, 0), 60)
+        cache.add(stampede.lock_key("key"), 1)
+        self.assertEqual(
+            stampede.get_or_set("key", self.compute, 60), "старое"
+        )
+        self.assertEqual(self.calls, 0)
+        cache.delete(stampede.lock_key("key"))
+        self.assertEqual(stampede.get_or_set("key", self.compute, 60), 1)
+
+    def test_expensive_value_is_refreshed_early(self):
+        cache.set("key", ("старое", time.time() + 1, 1000), 60)
+        self.assertEqual(stampede.get_or_set("key", self.compute, 60), 1)
+
+    def test_missing_value_waits_for_lock_owner(self):
+        cache.add(stampede.lock_key("key"), 1)
+        threading.Timer(
+            0.1, cache.set, ["key", ("готово", time.time() + 60, 0)]
+        ).start()
+        self.assertEqual(
+            stampede.get_or_set("key", self.compute, 60), "готово"
+        )
+        self.assertEqual(self.calls, 0)
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+        },
+        "two-tier-shared": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "two-tier-shared",
+        },
+    }
+)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["two-tier-shared"].clear()
+        params = {"OPTIONS": {"MAX_ENTRIES": 3, "BROADCAST_INTERVAL": 60}}
+        # Два обработчика: общий кэш один, память у каждого своя.
+        self.first = TwoTierCache("two-tier-shared", params)
+        self.first.local = LocalTier()
+        self.second = TwoTierCache("two-tier-shared", params)
+        self.second.local = LocalTier()
+        self.shared = caches["two-tier-shared"]
+
+    def test_hot_keys_are_served_from_memory(self):
+        self.first.set("group", "Группа")
+        self.assertEqual(self.second.get("group"), "Группа")
+        self.shared.set("group", "Новое название")
+        self.assertEqual(self.second.get("group"), "Группа")
+        self.assertEqual(
+            self.second.get_many(["group", "missing"]), {"group": "Группа"}
+        )
+
+    def test_version_bump_is_broadcast(self):
+        self.first.set("version", 1)
+        self.second.sync(force=True)
+        self.assertEqual(self.second.get("version"), 1)
+        self.first.incr("version")
+        self.assertEqual(self.second.get("version"), 1, "Ещё не сверялся.")
+        self.second.sync(force=True)
+        self.assertEqual(self.second.get("version"), 2)
+        self.assertEqual(self.first.get("version"), 2)
+
+    def test_memory_is_bounded(self):
+        for number in range(5):
+            self.first.set(f"key{number}", number)
+        self.assertEqual(len(self.first.local.entries), 3)
+        self.assertEqual(self.first.get("key0"), 0)
+
+
+class AtomicDatabaseCacheTests(TestCase):
+    def setUp(self):
+        self.cache = AtomicDatabaseCache("default", {})
+
+    def test_values_round_trip(self):
+        self.cache.set("number", 5)
+        self.cache.set("card", {"html": "<p>"}, 60)
+        self.assertEqual(self.cache.get("number"), 5)
+        self.assertEqual(
+            self.cache.get_many(["card", "missing"]),
+            {"card": {"html": "<p>"}},
+        )
+        self.cache.set("gone", 1, 0)
+        self.assertIsNone(self.cache.get("gone"))
+
+    def test_add_and_incr(self):
+        self.assertTrue(self.cache.add("lock", 1, 60))
+        self.assertFalse(self.cache.add("lock", 2, 60))
+        self.assertEqual(self.cache.incr("lock", 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+        self.cache.set("lock", 1, -1)
+        self.assertTrue(self.cache.add("lock", 3), "Истёкший ключ свободен.")
+
+    def test_permanent_keys_are_culled_last(self):
+        cache = AtomicDatabaseCache(
+            "default", {"OPTIONS": {"MAX_ENTRIES": 3, "CULL_FREQUENCY": 2}}
+        )
+        cache.set("version", 1, None)
+        for number in range(4):
+            cache.set(f"page:{number}", number, 60 + number)
+        self.assertEqual(cache.get("version"), 1)
+        self.assertIsNone(cache.get("page:0"))
+
+
+class AtomicDatabaseCacheRaceTests(SimpleTestCase):
+    """
+    Параллельные incr() — в файле SQLite: тестовая база в памяти не ждёт
+    блокировок, а сразу отвечает «database table is locked».
+    """
+
+    databases = {"cache-race"}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases["cache-race"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(cls.directory, "cache.sqlite3"),
+        }
+        with connections["cache-race"].schema_editor() as editor:
+            editor.create_model(CacheEntry)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["cache-race"].close()
+        del connections.databases["cache-race"]
+        shutil.rmtree(cls.directory)
+
+    def test_parallel_increments_are_not_lost(self):
+        shared = AtomicDatabaseCache("cache-race", {})
+        shared.set("generation", 0, None)
+        seen = []
+
+        def bump():
+            try:
+                for _ in range(10):
+                    seen.append(shared.incr("generation"))
+            finally:
+                connections["cache-race"].close()
+
+        threads = [threading.Thread(target=bump) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(shared.get("generation"), 40)
+        self.assertEqual(sorted(seen), list(range(1, 41)))
+
+
+@override_settings(TASKS_EAGER=False, TASKS_MAX_ATTEMPTS=2)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_task_runs_and_is_removed(self):
+        tasks.enqueue(remember, "значение")
+        self.assertEqual(CALLS, [])
+        self.assertEqual(tasks.run_pending(), [True])
+        self.assertEqual(CALLS, ["значение"])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_task_is_retried_with_backoff(self):
+        task_obj = tasks.enqueue(explode)
+        self.assertEqual(tasks.run_pending(), [False])
+        task_obj.refresh_from_db()
+        self.assertEqual(task_obj.status, Task.PENDING)
+        self.assertEqual(task_obj.attempts, 1)
+        self.assertIn("Ошибка задачи", task_obj.last_error)
+        self.assertEqual(tasks.run_pending(), [], "Повтор ещё не наступил.")
+
+        Task.objects.update(run_at=task_obj.created)
+        self.assertEqual(tasks.run_pending(), [False])
+        task_obj.refresh_from_db()
+        self.assertEqual(task_obj.status, Task.FAILED)
+        self.assertEqual(tasks.backoff(3), 40)
+
+    def test_task_is_claimed_once(self):
+        tasks.enqueue(remember, 1)
+        self.assertEqual(len(tasks.claim(10, "first")), 1)
+        self.assertEqual(tasks.claim(10, "second"), [])
+
+    def test_only_marked_functions_are_queued(self):
+        with self.assertRaises(ValueError):
+            tasks.enqueue(print, "не задача")
+
+    @override_settings(TASKS_PERIODIC={"core.tests.tick": 60})
+    def test_periodic_task_is_scheduled_again(self):
+        tasks.schedule_periodic()
+        tasks.schedule_periodic()
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(tasks.run_pending(), [True])
+        self.assertEqual(CALLS, ["tick"])
+        task_obj = Task.objects.get()
+        self.assertEqual(task_obj.name, "core.tests.tick")
+        self.assertEqual(tasks.run_pending(), [], "Интервал ещё не прошёл.")
+
+
+@override_settings(TASKS_EAGER=False, TASKS_PERIODIC={})
+class RunWorkerTests(TransactionTestCase):
+    def test_run_worker_drains_queue(self):
+        """Обработчик выполняет задачи в потоках других соединений."""
+        CALLS.clear()
+        for value in range(3):
+            tasks.enqueue(remember, value)
+        call_command("run_worker", threads=2, once=True, stdout=StringIO())
+        self.assertEqual(sorted(CALLS), [0, 1, 2])
+        self.assertFalse(Task.objects.exists())
@@ -1,10 +1,37 @@
 # posts/admin.py
 from django.contrib import admin
 
+from . import bulk, search
+from .caching import posts_version
 from .models import Group, Post
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) по всей таблице на каждое открытие."""
+
+    paginator = EstimatedCountPaginator
+    # Иначе при фильтрах список считает ещё и всю таблицу.
+    show_full_result_count = False
+
+    def get_paginator(
+        self,
+        request,
+        queryset,
+        per_page,
+        orphans=0,
+        allow_empty_first_page=True,
+    ):
+        return self.paginator(
+            queryset,
+            per_page,
+            orphans,
+            allow_empty_first_page,
+            version=posts_version(),
+        )
+
+
+class PostAdmin(EstimatedCountAdmin):
     list_display = (
         "pk",
         "text",
@@ -13,12 +40,41 @@ class PostAdmin(admin.ModelAdmin):
         "group",
     )
     list_editable = ("group",)
+    list_select_related = ("author", "group")
     search_fields = ("text",)
-    list_filter = ("pub_date",)
+    # Оба фильтра идут по индексам post_pub_date и post_group_pub_date.
+    list_filter = ("pub_date", "group")
+    actions = ("remove_from_group",)
     empty_value_display = "-пусто-"
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs
+        )
+        if db_field.name == "group":
+            # Поле копируется в форму каждой строки списка, и каждая копия
+            # заново читала бы группы из базы. Готовый список читается
+            # один раз на запрос.
+            formfield.choices = list(formfield.choices)
+        return formfield
+
+    def get_search_results(self, request, queryset, search_term):
+        matching = search.filter_matching(queryset, search_term)
+        if matching is None:
+            return super().get_search_results(request, queryset, search_term)
+        return matching, False
+
+    def delete_queryset(self, request, queryset):
+        bulk.delete_posts(queryset)
+
+    def remove_from_group(self, request, queryset):
+        updated = bulk.move_posts(queryset, None)
+        self.message_user(request, f"Убрано из групп постов: {updated}.")
+
+    remove_from_group.short_description = "Убрать из группы"
+
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(EstimatedCountAdmin):
     list_display = (
         "id",
         "slug",
@@ -0,0 +1,178 @@
+# posts/api.py
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from .models import Comment, Group, Post, User
+from .paginators import CursorPaginator
+from .timeline import timeline
+
+# Проекции строятся через .values(): в ответ не нужны модели целиком.
+POST_FIELDS = (
+    "id",
+    "text",
+    "pub_date",
+    "author__username",
+    "group__slug",
+    "image",
+    "image_webp",
+    "comments_count",
+)
+COMMENT_FIELDS = ("id", "text", "created", "author__username")
+EXPORT_CHUNK_SIZE = 2000
+
+
+def image_url(name):
+    if not name:
+        return None
+    return Post._meta.get_field("image").storage.url(name)
+
+
+def post_row(row):
+    return {
+        "id": row["id"],
+        "text": row["text"],
+        "pub_date": row["pub_date"],
+        "author": row["author__username"],
+        "group": row["group__slug"],
+        "image": image_url(row["image"]),
+        "image_webp": image_url(row["image_webp"]),
+        "comments_count": row["comments_count"],
+    }
+
+
+def comment_row(row):
+    return {
+        "id": row["id"],
+        "text": row["text"],
+        "created": row["created"],
+        "author": row["author__username"],
+    }
+
+
+def cursor_page(request, database_query, serialize, per_page, ordering):
+    """Страница keyset-пагинации в виде словаря для JSON."""
+    paginator = CursorPaginator(database_query, per_page, ordering)
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    return {
+        "results": [serialize(row) for row in page_obj],
+        "next": page_obj.next_cursor,
+        "previous": page_obj.previous_cursor,
+    }
+
+
+def posts_page(request, database_query):
+    return cursor_page(
+        request,
+        database_query.values(*POST_FIELDS),
+        post_row,
+        settings.POSTS_ON_PAGE,
+        ("-pub_date", "-id"),
+    )
+
+
+def error(detail, status):
+    return JsonResponse({"detail": detail}, status=status)
+
+
+@require_safe
+def index(request):
+    return JsonResponse(posts_page(request, Post.objects.all()))
+
+
+@require_safe
+def group_posts(request, slug):
+    group = (
+        Group.objects.filter(slug=slug)
+        .values("slug", "title", "description", "posts_count")
+        .first()
+    )
+    if group is None:
+        return error("Группа не найдена.", 404)
+    posts = posts_page(request, Post.objects.filter(group__slug=slug))
+    return JsonResponse({"group": group, **posts})
+
+
+@require_safe
+def profile(request, username):
+    author = (
+        User.objects.filter(username=username)
+        .values(
+            "username",
+            "first_name",
+            "last_name",
+            "stats__posts_count",
+            "stats__followers_count",
+            "stats__following_count",
+        )
+        .first()
+    )
+    if author is None:
+        return error("Пользователь не найден.", 404)
+    posts = posts_page(request, Post.objects.filter(author__username=username))
+    full_name = f"{author['first_name']} {author['last_name']}"
+    author = {
+        "username": author["username"],
+        "full_name": full_name.strip(),
+        "posts_count": author["stats__posts_count"] or 0,
+        "followers_count": author["stats__followers_count"] or 0,
+        "following_count": author["stats__following_count"] or 0,
+    }
+    return JsonResponse({"author": author, **posts})
+
+
+@require_safe
+def post_detail(request, post_id):
+    post = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if post is None:
+        return error("Пост не найден.", 404)
+    comments = cursor_page(
+        request,
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        comment_row,
+        settings.COMMENTS_ON_PAGE,
+        ("-created", "-id"),
+    )
+    return JsonResponse({"post": post_row(post), "comments": comments})
+
+
+@require_safe
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return error("Нужно войти в аккаунт.", 401)
+    return JsonResponse(posts_page(request, timeline(request.user)))
+
+
+@require_safe
+def export(request):
+    """
+    Все посты одним JSON-массивом, который отдаётся по мере чтения:
+    строки идут из курсора пачками и не копятся в памяти.
+    """
+    database_query = Post.objects.order_by("id")
+    if "group" in request.GET:
+        database_query = database_query.filter(
+            group__slug=request.GET["group"]
+        )
+    if "author" in request.GET:
+        database_query = database_query.filter(
+            author__username=request.GET["author"]
+        )
+    rows = database_query.values(*POST_FIELDS).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    return StreamingHttpResponse(
+        stream_array(rows, post_row), content_type="application/json"
+    )
+
+
+def stream_array(rows, serialize):
+    yield "["
+    for number, row in enumerate(rows):
+        if number:
+            yield ","
+        yield json.dumps(serialize(row), cls=DjangoJSONEncoder)
+    yield "]"
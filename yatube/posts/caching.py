@@ -0,0 +1,137 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import stampede
+
+from .paginators import CursorPage, CursorPaginator
+
+POSTS_VERSION_KEY = "posts:version"
+CARD_TEMPLATE = "posts/includes/post_card.html"
+# Карточка выглядит по-разному в ленте автора и в ленте группы.
+CARD_VARIANTS = {
+    "posts:profile": "profile",
+    "posts:group_list": "group",
+}
+
+
+def version(key):
+    """Текущее значение счётчика версии, которым помечены ключи кэша."""
+    value = cache.get(key)
+    if value is None:
+        # Начинаем с отметки времени, а не с 1: после вытеснения счётчика
+        # из кэша старые ключи не должны снова стать актуальными.
+        cache.add(key, int(time.time()), None)
+        value = cache.get(key)
+    return value
+
+
+def bump_version(key):
+    """
+    Сдвигает версию после коммита: до него параллельный запрос ещё видит
+    старые данные и положил бы их в кэш под новой версией.
+    """
+    transaction.on_commit(lambda: _incr_version(key))
+
+
+def _incr_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time()), None)
+
+
+def posts_version():
+    """Текущая версия данных, видимых в лентах постов."""
+    return version(POSTS_VERSION_KEY)
+
+
+def bump_posts_version():
+    bump_version(POSTS_VERSION_KEY)
+
+
+def user_version_key(user_id):
+    return f"posts:user:version:{user_id}"
+
+
+def user_version(user_id):
+    """Версия личных данных пользователя: ленты подписок и подписок."""
+    return version(user_version_key(user_id))
+
+
+def bump_user_versions(user_ids):
+    for user_id in user_ids:
+        bump_version(user_version_key(user_id))
+
+
+def page_key(prefix, request, data_version=None):
+    """
+    Ключ страницы ленты: раздел, версия данных (по умолчанию — версия
+    постов) и номер/курсор.
+    """
+    if data_version is None:
+        data_version = posts_version()
+    query = "|".join(request.GET.get(name, "") for name in ("page", "cursor"))
+    digest = hashlib.md5(f"{'cursor' in request.GET}|{query}".encode())
+    return f"posts:page:{prefix}:{data_version}:{digest.hexdigest()}"
+
+
+def detach(page_obj):
+    """Копия страницы без ссылки на queryset, пригодная для кэша."""
+    object_list = list(page_obj.object_list)
+    paginator = page_obj.paginator
+    if isinstance(page_obj, CursorPage):
+        return CursorPage(
+            object_list,
+            CursorPaginator(None, paginator.per_page, paginator.ordering),
+            page_obj.next_cursor,
+            page_obj.previous_cursor,
+        )
+    detached = Paginator(
+        [],
+        paginator.per_page,
+        paginator.orphans,
+        paginator.allow_empty_first_page,
+    )
+    detached.count = paginator.count
+    return Page(object_list, page_obj.number, detached)
+
+
+def get_or_set_page(prefix, request, paginate, data_version=None):
+    """Возвращает страницу ленты из кэша или строит её через paginate()."""
+    return stampede.get_or_set(
+        page_key(prefix, request, data_version),
+        lambda: detach(paginate()),
+        settings.POSTS_PAGE_CACHE_TIMEOUT,
+    )
+
+
+def card_key(post, view_name):
+    variant = CARD_VARIANTS.get(view_name, "default")
+    return f"posts:card:{variant}:{post.pk}:{post.version}"
+
+
+def render_cards(posts, view_name=None):
+    """
+    HTML карточек постов: готовые берутся из кэша одним get_many,
+    отрисовываются и сохраняются только промахи.
+    """
+    posts = list(posts)
+    keys = [card_key(post, view_name) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    for post, key in zip(posts, keys):
+        if key not in cards:
+            missing[key] = render_to_string(
+                CARD_TEMPLATE, {"post": post, "view_name": view_name}
+            )
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,60 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    quote_etag,
+)
+from django.utils.http import http_date
+
+
+def make_etag(request, *parts):
+    """ETag страницы: страница зависит от данных и от того, кто смотрит."""
+    raw = repr((request.user.pk, parts)).encode()
+    return hashlib.md5(raw).hexdigest()
+
+
+def conditional(validators):
+    """
+    Условный GET для страниц, которые дорого рендерить.
+
+    validators(request, *args, **kwargs) дешёвыми запросами считает пару
+    (etag, last_modified) до рендеринга; если клиент прислал совпадающие
+    If-None-Match или If-Modified-Since, вьюха не вызывается вовсе и
+    отдаётся 304. Пара (None, None) означает «валидаторов нет», например
+    для несуществующего объекта: тогда ответ строит сама вьюха.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(request, *args, **kwargs)
+            if etag is not None:
+                etag = quote_etag(etag)
+            timestamp = None
+            if last_modified is not None:
+                timestamp = int(last_modified.timestamp())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+            if etag is not None and not response.has_header("ETag"):
+                response["ETag"] = etag
+            if timestamp is not None and not response.has_header(
+                "Last-Modified"
+            ):
+                response["Last-Modified"] = http_date(timestamp)
+            # Страницы персональные, и браузер должен каждый раз
+            # переспрашивать сервер, а не угадывать срок свежести.
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return inner
+
+    return decorator
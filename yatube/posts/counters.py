@@ -0,0 +1,117 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, Stats, User
+
+
+def _increments(deltas):
+    # Счётчик мог разойтись с таблицей (bulk_create без сигналов):
+    # уменьшение не уходит ниже нуля и не нарушает CHECK поля.
+    return {
+        field: (
+            F(field) + delta if delta >= 0 else Greatest(F(field) + delta, 0)
+        )
+        for field, delta in deltas.items()
+    }
+
+
+def bump(model, pk, **deltas):
+    """Атомарно меняет счётчики одной строки выражениями F()."""
+    if pk is not None:
+        model.objects.filter(pk=pk).update(**_increments(deltas))
+
+
+def bump_user(user_id, create=False, **deltas):
+    updated = Stats.objects.filter(user_id=user_id).update(
+        **_increments(deltas)
+    )
+    if not updated and create:
+        recount_user(user_id)
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики пользователя по таблицам."""
+    counts = {
+        "posts_count": Post.objects.filter(author_id=user_id).count(),
+        "comments_count": Comment.objects.filter(author_id=user_id).count(),
+        "followers_count": Follow.objects.filter(author_id=user_id).count(),
+        "following_count": Follow.objects.filter(user_id=user_id).count(),
+    }
+    try:
+        with transaction.atomic():
+            stats, _ = Stats.objects.update_or_create(
+                user_id=user_id, defaults=counts
+            )
+    except IntegrityError:
+        stats = Stats.objects.get(user_id=user_id)
+    return stats
+
+
+def user_stats(user):
+    try:
+        return user.stats
+    except Stats.DoesNotExist:
+        return recount_user(user.id)
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def recount_some(group_ids=(), user_ids=(), post_ids=()):
+    """Пересчитывает счётчики перечисленных групп, пользователей и постов."""
+    Group.objects.filter(pk__in=group_ids).update(
+        posts_count=_count(Post.objects.all(), "group")
+    )
+    Stats.objects.filter(user_id__in=user_ids).update(
+        posts_count=_count(Post.objects.all(), "author"),
+        comments_count=_count(Comment.objects.all(), "author"),
+    )
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count(Comment.objects.all(), "post")
+    )
+
+
+def recount_users(user_ids):
+    """Пересчитывает все счётчики перечисленных пользователей."""
+    Stats.objects.bulk_create(
+        [Stats(user_id=pk) for pk in user_ids], ignore_conflicts=True
+    )
+    Stats.objects.filter(user_id__in=user_ids).update(
+        posts_count=_count(Post.objects.all(), "author"),
+        comments_count=_count(Comment.objects.all(), "author"),
+        followers_count=_count(Follow.objects.all(), "author"),
+        following_count=_count(Follow.objects.all(), "user"),
+    )
+
+
+def recount_all():
+    """Пересчитывает все счётчики несколькими UPDATE по таблицам."""
+    Stats.objects.bulk_create(
+        [
+            Stats(user_id=pk)
+            for pk in User.objects.filter(stats__isnull=True).values_list(
+                "pk", flat=True
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    Stats.objects.update(
+        posts_count=_count(Post.objects.all(), "author"),
+        comments_count=_count(Comment.objects.all(), "author"),
+        followers_count=_count(Follow.objects.all(), "author"),
+        following_count=_count(Follow.objects.all(), "user"),
+    )
+    Post.objects.update(comments_count=_count(Comment.objects.all(), "post"))
+    Group.objects.update(posts_count=_count(Post.objects.all(), "group"))
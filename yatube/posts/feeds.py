@@ -0,0 +1,187 @@
+# posts/feeds.py
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    quote_etag,
+)
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date
+from django.utils.text import Truncator
+
+from core import stampede
+
+from .caching import bump_version, version
+from .models import Group, Post, User
+
+INDEX_SCOPE = "index"
+
+
+def group_scope(group_id):
+    return f"group:{group_id}"
+
+
+def author_scope(author_id):
+    return f"author:{author_id}"
+
+
+def scope_version_key(scope):
+    return f"posts:feed:version:{scope}"
+
+
+def bump_scopes(*scopes):
+    """Сбрасывает кэш лент только тех разделов, где изменились посты."""
+    for scope in scopes:
+        bump_version(scope_version_key(scope))
+
+
+class PostsFeed(Feed):
+    title = "Yatube: последние обновления"
+    description = "Новые посты всех авторов"
+
+    def link(self, obj):
+        return reverse("posts:index")
+
+    def scope(self, obj):
+        return INDEX_SCOPE
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        return self.posts(obj).select_related("author", "group")[
+            : settings.FEED_ITEMS
+        ]
+
+    def item_title(self, post):
+        return Truncator(post.text).chars(50)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse("posts:post_detail", args=[post.pk])
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group else []
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f"Yatube: записи сообщества {group.title}"
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse("posts:group_list", args=[group.slug])
+
+    def scope(self, group):
+        return group_scope(group.pk)
+
+    def posts(self, group):
+        return group.posts.all()
+
+
+class ProfileFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f"Yatube: посты {author.get_full_name() or author.username}"
+
+    def description(self, author):
+        return f"Новые посты пользователя {author.username}"
+
+    def link(self, author):
+        return reverse("posts:profile", args=[author.username])
+
+    def scope(self, author):
+        return author_scope(author.pk)
+
+    def posts(self, author):
+        return author.posts.all()
+
+
+class AtomPostsFeed(PostsFeed):
+    feed_type = Atom1Feed
+    subtitle = PostsFeed.description
+
+
+class AtomGroupFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, group):
+        return self.description(group)
+
+
+class AtomProfileFeed(ProfileFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, author):
+        return self.description(author)
+
+
+def rendered_feed(feed, request, kwargs):
+    """
+    XML ленты из кэша. Ключ включает версию раздела, поэтому новый пост
+    в группе не трогает кэш лент других групп и авторов.
+    """
+    obj = feed.get_object(request, **kwargs)
+    scope = feed.scope(obj)
+    key = "posts:feed:{}:{}:{}:{}".format(
+        type(feed).__name__,
+        scope,
+        version(scope_version_key(scope)),
+        request.get_host(),
+    )
+
+    def build():
+        response = feed(request, **kwargs)
+        return {
+            "content": response.content,
+            "content_type": response["Content-Type"],
+            "etag": hashlib.md5(key.encode()).hexdigest(),
+            # Время сборки, а не дата последнего поста: правка старого
+            # поста тоже должна считаться изменением ленты.
+            "last_modified": int(time.time()),
+        }
+
+    return stampede.get_or_set(key, build, settings.FEED_CACHE_TIMEOUT)
+
+
+def feed_view(feed_class):
+    feed = feed_class()
+
+    def view(request, **kwargs):
+        entry = rendered_feed(feed, request, kwargs)
+        etag = quote_etag(entry["etag"])
+        response = get_conditional_response(
+            request, etag=etag, last_modified=entry["last_modified"]
+        )
+        if response is None:
+            response = HttpResponse(
+                entry["content"], content_type=entry["content_type"]
+            )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(entry["last_modified"])
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    return view
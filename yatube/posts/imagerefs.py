@@ -0,0 +1,119 @@
+"""
+Счётчик ссылок на файлы картинок и сборка мусора.
+
+Одинаковые картинки разных постов лежат в одном файле (posts.storage),
+поэтому файл можно удалить, только когда на него не ссылается ни один
+пост. Сигналы постов меняют ImageRef.refs выражениями F(); collect()
+удаляет файлы без ссылок вместе с их миниатюрами.
+"""
+
+from datetime import timedelta
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import IMAGE_FIELDS, ImageRef, Post
+from .storage import image_storage
+
+
+def change(name, delta):
+    """Атомарно прибавляет delta к числу ссылок на файл name."""
+    if not name:
+        return
+    updated = ImageRef.objects.filter(name=name).update(
+        refs=F("refs") + delta, updated=timezone.now()
+    )
+    if updated or delta <= 0:
+        # Без строки файл никто не учитывал (например, пост пришёл через
+        # bulk_create): строка с нулём сделала бы его добычей collect().
+        return
+    try:
+        with transaction.atomic():
+            ImageRef.objects.create(name=name, refs=delta)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос.
+        change(name, delta)
+
+
+def acquire(name):
+    change(name, 1)
+
+
+def release(name):
+    change(name, -1)
+
+
+def _image_counts(posts):
+    counts = {}
+    for field in IMAGE_FIELDS:
+        rows = (
+            posts.exclude(**{field: ""})
+            .order_by()
+            .values_list(field)
+            .annotate(total=Count("pk"))
+        )
+        for name, total in rows:
+            counts[name] = counts.get(name, 0) + total
+    return counts
+
+
+def acquire_posts(post_ids):
+    """Добавляет ссылки на картинки постов, сохранённых без сигналов."""
+    counts = _image_counts(Post.objects.filter(pk__in=post_ids))
+    for name, total in counts.items():
+        change(name, total)
+
+
+def recount():
+    """Пересчитывает ссылки по таблице постов; чинит расхождения."""
+    counts = _image_counts(Post.objects.all())
+    now = timezone.now()
+    with transaction.atomic():
+        ImageRef.objects.exclude(name__in=counts).update(refs=0, updated=now)
+        for name, total in counts.items():
+            ImageRef.objects.update_or_create(
+                name=name, defaults={"refs": total}
+            )
+
+
+def collect(grace):
+    """
+    Удаляет файлы, на которые никто не ссылается дольше grace секунд,
+    и возвращает их имена. Пауза нужна, чтобы не удалить файл, который
+    только что загружен повторно и ещё не получил ссылку.
+    """
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    names = ImageRef.objects.filter(refs__lte=0, updated__lt=cutoff)
+    removed = []
+    for name in names.values_list("name", flat=True).iterator():
+        if _touched_since(name, cutoff):
+            continue
+        # Условие повторяется в DELETE: ссылка могла появиться только что.
+        deleted, _ = ImageRef.objects.filter(
+            name=name, refs__lte=0, updated__lt=cutoff
+        ).delete()
+        if deleted:
+            _delete_file(name)
+            removed.append(name)
+    return removed
+
+
+def _touched_since(name, cutoff):
+    try:
+        modified = image_storage.get_modified_time(name)
+    except (OSError, SuspiciousFileOperation):
+        return False
+    return modified >= cutoff
+
+
+def _delete_file(name):
+    try:
+        # Миниатюры sorl и их записи в хранилище ключей.
+        default.kvstore.delete(ImageFile(name, image_storage))
+        image_storage.delete(name)
+    except SuspiciousFileOperation:
+        pass
@@ -0,0 +1,177 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, ImageSequence
+
+# Форматы, которые храним как есть (пересжатыми); остальное — в JPEG/PNG.
+KEPT_FORMATS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp"}
+# Анимация сохраняется только в этих форматах; у остальных многокадровых
+# (MPO, TIFF) остаётся первый кадр.
+ANIMATED_FORMATS = {"GIF", "PNG", "WEBP"}
+
+
+def validate(file):
+    """Валидатор поля: проверяет только новые, ещё не сохранённые файлы."""
+    if not getattr(file, "_committed", False):
+        inspect(file)
+
+
+def inspect(file):
+    """
+    Проверяет картинку по заголовку, не декодируя пиксели: Image.open()
+    читает только размеры и формат, поэтому «бомба» в гигапиксели
+    отклоняется до того, как займёт память. Так же ограничены кадры
+    анимации.
+    """
+    if file.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            "Файл слишком большой: не больше %(limit)d МБ.",
+            params={"limit": settings.POST_IMAGE_MAX_BYTES // 2**20},
+        )
+    file.seek(0)
+    try:
+        image = Image.open(file)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError("Загрузите корректное изображение.")
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Слишком большое изображение: %(width)d×%(height)d.",
+            params={"width": width, "height": height},
+        )
+    _check_frames(image, width * height)
+    file.seek(0)
+    return image
+
+
+def _check_frames(image, pixels):
+    """
+    Считает кадры анимации и отклоняет её, как только кадров становится
+    больше POST_IMAGE_MAX_FRAMES или в сумме больше
+    POST_IMAGE_MAX_ANIMATION_PIXELS пикселей: дальше файл не читается.
+    """
+    frames = 1
+    while True:
+        try:
+            image.seek(frames)
+        except EOFError:
+            break
+        frames += 1
+        if frames > settings.POST_IMAGE_MAX_FRAMES:
+            raise ValidationError(
+                "Слишком длинная анимация: больше %(limit)d кадров.",
+                params={"limit": settings.POST_IMAGE_MAX_FRAMES},
+            )
+        if frames * pixels > settings.POST_IMAGE_MAX_ANIMATION_PIXELS:
+            raise ValidationError(
+                "Слишком большая анимация: уменьшите кадры или их число."
+            )
+    image.seek(0)
+
+
+def normalize(file):
+    """
+    Готовит загруженную картинку к хранению: поворачивает по EXIF,
+    уменьшает до POST_IMAGE_MAX_SIZE, пересжимает без метаданных и
+    делает WebP-вариант. Возвращает (имя, оригинал, имя WebP, WebP).
+    """
+    image = inspect(file)
+    source_format = image.format
+    animated = (
+        getattr(image, "is_animated", False)
+        and source_format in ANIMATED_FORMATS
+    )
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    if source_format == "JPEG":
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+        image.draft("RGB", max_size)
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+    extension = KEPT_FORMATS.get(source_format)
+
+    if animated:
+        # Каждый кадр уменьшается и пересохраняется, как и картинка.
+        frames, durations = _frames(image, max_size)
+        loop = image.info.get("loop", 0)
+        original = ContentFile(
+            _encode_animation(frames, durations, loop, extension)
+        )
+        webp = ContentFile(_encode_animation(frames, durations, loop, ".webp"))
+        return f"{stem}{extension}", original, f"{stem}.webp", webp
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    if extension is None:
+        extension = ".png" if _has_alpha(image) else ".jpg"
+    original = ContentFile(_encode(image, extension))
+    webp = ContentFile(_encode(image, ".webp"))
+    return f"{stem}{extension}", original, f"{stem}.webp", webp
+
+
+def _frames(image, max_size):
+    """Кадры анимации, уменьшенные до max_size, и их длительности."""
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get("duration", 100))
+        frame = frame.convert("RGBA")
+        frame.thumbnail(max_size, Image.LANCZOS)
+        frames.append(frame)
+    return frames, durations
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA") or "transparency" in image.info
+
+
+def _encode_animation(frames, durations, loop, extension):
+    """Сохраняет кадры анимацией без метаданных исходного файла."""
+    output = BytesIO()
+    first, *rest = frames
+    options = {
+        "save_all": True,
+        "append_images": rest,
+        "duration": durations,
+        "loop": loop,
+    }
+    if extension == ".gif":
+        first.save(output, "GIF", optimize=True, disposal=2, **options)
+    elif extension == ".png":
+        first.save(output, "PNG", optimize=True, **options)
+    else:
+        first.save(
+            output,
+            "WEBP",
+            quality=settings.POST_IMAGE_QUALITY,
+            method=4,
+            **options,
+        )
+    return output.getvalue()
+
+
+def _encode(image, extension):
+    """Сохраняет без EXIF и прочих метаданных, кроме цветового профиля."""
+    output = BytesIO()
+    options = {"icc_profile": image.info.get("icc_profile")}
+    quality = settings.POST_IMAGE_QUALITY
+    if extension == ".jpg":
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(
+            output,
+            "JPEG",
+            quality=quality,
+            optimize=True,
+            progressive=True,
+            **options,
+        )
+    elif extension == ".png":
+        image.save(output, "PNG", optimize=True, **options)
+    elif extension == ".gif":
+        image.save(output, "GIF", optimize=True)
+    else:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+        image.save(output, "WEBP", quality=quality, method=4, **options)
+    return output.getvalue()
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит индекс и шарды карты сайта, переписывая только шарды, "
+        "изменившиеся с прошлого запуска."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--root",
+            default=settings.SITEMAP_ROOT,
+            help="Каталог, куда пишутся файлы карты сайта.",
+        )
+        parser.add_argument(
+            "--base-url",
+            default=settings.SITEMAP_BASE_URL,
+            help="Адрес сайта, с которого начинаются ссылки.",
+        )
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=settings.SITEMAP_SHARD_SIZE,
+            help="Сколько первичных ключей покрывает один шард.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Сколько строк читать из базы за раз.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Переписать все шарды, не сверяясь с прошлым запуском.",
+        )
+
+    def handle(self, *args, **options):
+        written = 0
+        for section, shard in sitemaps.build(
+            options["root"],
+            options["base_url"].rstrip("/"),
+            options["shard_size"],
+            options["chunk_size"],
+            options["full"],
+        ):
+            written += 1
+            self.stdout.write(f"Записан шард {section} {shard}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово, перезаписано шардов: {written}.")
+        )
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import imagerefs
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет картинки постов и их миниатюры, на которые больше "
+        "не ссылается ни один пост."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=settings.IMAGE_GC_GRACE,
+            help="Сколько секунд файл без ссылок ещё хранится.",
+        )
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Сначала пересчитать ссылки по таблице постов.",
+        )
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            imagerefs.recount()
+        removed = imagerefs.collect(options["grace"])
+        for name in removed:
+            self.stdout.write(f"Удалён {name}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Готово, удалено файлов: {len(removed)}.")
+        )
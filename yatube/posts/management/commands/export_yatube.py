@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает пользователей, группы, посты, комментарии и подписки "
+        "в NDJSON или CSV, читая базу пачками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=transfer.FORMATS, default=transfer.NDJSON
+        )
+        parser.add_argument(
+            "--kind",
+            action="append",
+            choices=list(transfer.KINDS),
+            help="Что выгружать; по умолчанию всё. Для CSV — ровно один вид.",
+        )
+        parser.add_argument(
+            "--output", help="Файл выгрузки; по умолчанию stdout."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Сколько строк читать из базы за раз.",
+        )
+
+    def handle(self, *args, **options):
+        kinds = options["kind"] or list(transfer.KINDS)
+        if options["format"] == transfer.CSV and len(kinds) != 1:
+            raise CommandError("В CSV выгружается ровно один вид записей.")
+        if options["output"]:
+            output = open(options["output"], "w", encoding="utf-8", newline="")
+            progress = self.stdout
+        else:
+            output, progress = self.stdout, self.stderr
+        try:
+            for kind, written in transfer.write(
+                output, kinds, options["format"], options["chunk_size"]
+            ):
+                progress.write(f"{kind}: {written}")
+        finally:
+            if output is not self.stdout:
+                output.close()
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает выгрузку export_yatube пачками bulk_create, находя "
+        "авторов и группы по username и slug."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл NDJSON или CSV.")
+        parser.add_argument(
+            "--format", choices=transfer.FORMATS, default=transfer.NDJSON
+        )
+        parser.add_argument(
+            "--kind",
+            choices=list(transfer.KINDS),
+            help="Вид записей в CSV-файле.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--post-id-offset",
+            type=int,
+            default=0,
+            help="Сдвиг id постов, если исходные id уже заняты.",
+        )
+
+    def handle(self, *args, **options):
+        if options["format"] == transfer.CSV and not options["kind"]:
+            raise CommandError("Для CSV укажите --kind.")
+        importer = transfer.Importer(
+            options["batch_size"], options["post_id_offset"]
+        )
+        try:
+            self.load(importer, options)
+        finally:
+            # Пачки коммитятся по одной: после ошибки в середине файла
+            # загруженная часть тоже должна попасть в счётчики и ленты.
+            if any(importer.imported.values()):
+                importer.refresh(self.stdout.write)
+        self.stdout.write(self.style.SUCCESS("Загрузка завершена."))
+
+    def load(self, importer, options):
+        with open(options["path"], encoding="utf-8", newline="") as source:
+            records = transfer.read(source, options["format"], options["kind"])
+            try:
+                for kind, imported in importer.run(records):
+                    self.stdout.write(f"{kind}: {imported}")
+            except IntegrityError as error:
+                raise CommandError(
+                    f"{error}. Id постов уже заняты? См. --post-id-offset."
+                )
+            except (KeyError, ValueError) as error:
+                raise CommandError(f"Некорректная запись: {error}")
+        for kind, skipped in importer.skipped.items():
+            if skipped:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{kind}: пропущено {skipped} записей: уже "
+                        "загружены или без автора, группы или поста."
+                    )
+                )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс постов пачками."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько постов индексировать за один запрос.",
+        )
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError("Полнотекстовый индекс есть только в SQLite.")
+        done = 0
+        for done in search.rebuild(options["batch_size"]):
+            self.stdout.write(f"Проиндексировано постов: {done}")
+        self.stdout.write(self.style.SUCCESS(f"Готово, всего: {done}."))
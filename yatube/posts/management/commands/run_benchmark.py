@@ -0,0 +1,183 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.metrics import percentile
+from posts.models import Follow, Group, Post, User
+
+VIEWS = ("index", "group_list", "profile", "post_detail", "follow_index")
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку, число SQL-запросов и пропускную способность "
+        "представлений posts и сохраняет результат в JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument(
+            "--views", nargs="+", choices=VIEWS, default=list(VIEWS)
+        )
+        parser.add_argument(
+            "--max-page",
+            type=int,
+            default=1,
+            help="Запрашивать случайные страницы лент от 1 до этой.",
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Очищать кэш перед каждым запросом.",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--output", help="Файл для JSON с результатами.")
+        parser.add_argument(
+            "--compare", help="JSON прошлого прогона для сравнения."
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.max_page = options["max_page"]
+        targets = self.targets()
+        results = {}
+        for view in options["views"]:
+            if not targets[view]:
+                self.stderr.write(f"{view}: нет данных, пропускаю.")
+                continue
+            results[view] = self.measure(view, targets[view], options)
+            self.report(view, results[view])
+
+        report = {
+            "created": timezone.now().isoformat(),
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "options": {
+                key: options[key]
+                for key in ("requests", "warmup", "max_page", "cold")
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def targets(self):
+        """Пулы адресов для каждого представления и клиент читателя."""
+        posts = list(
+            Post.objects.order_by("?").values_list("id", flat=True)[:1000]
+        )
+        groups = list(
+            Group.objects.annotate(total=Count("posts"))
+            .order_by("-total")
+            .values_list("slug", flat=True)[:50]
+        )
+        authors = list(
+            User.objects.annotate(total=Count("posts"))
+            .order_by("-total")
+            .values_list("username", flat=True)[:50]
+        )
+        reader = (
+            User.objects.annotate(total=Count("follower"))
+            .order_by("-total")
+            .first()
+        )
+        if reader is None or not Follow.objects.filter(user=reader).exists():
+            reader = None
+        self.reader = reader
+        return {
+            "index": [reverse("posts:index")],
+            "group_list": [
+                reverse("posts:group_list", args=[slug]) for slug in groups
+            ],
+            "profile": [
+                reverse("posts:profile", args=[name]) for name in authors
+            ],
+            "post_detail": [
+                reverse("posts:post_detail", args=[pk]) for pk in posts
+            ],
+            "follow_index": [reverse("posts:follow_index")] if reader else [],
+        }
+
+    def client_for(self, view):
+        # Адрес не из INTERNAL_IPS, чтобы в замеры не попал debug_toolbar.
+        client = Client(REMOTE_ADDR="192.0.2.1")
+        if view == "follow_index":
+            client.force_login(self.reader)
+        return client
+
+    def url(self, urls, view):
+        url = self.random.choice(urls)
+        if view != "post_detail" and self.max_page > 1:
+            url += f"?page={self.random.randint(1, self.max_page)}"
+        return url
+
+    def measure(self, view, urls, options):
+        client = self.client_for(view)
+        for _ in range(options["warmup"]):
+            client.get(self.url(urls, view))
+
+        latencies = []
+        queries = []
+        started = time.perf_counter()
+        for _ in range(options["requests"]):
+            url = self.url(urls, view)
+            if options["cold"]:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url} вернул {response.status_code}")
+            queries.append(len(captured))
+        elapsed = time.perf_counter() - started
+
+        return {
+            "requests": len(latencies),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "queries_avg": sum(queries) / len(queries),
+            "queries_max": max(queries),
+            "rps": len(latencies) / elapsed,
+        }
+
+    def report(self, view, row):
+        self.stdout.write(
+            f"{view:<14} p50 {row['p50_ms']:8.2f} ms  "
+            f"p95 {row['p95_ms']:8.2f} ms  p99 {row['p99_ms']:8.2f} ms  "
+            f"SQL {row['queries_avg']:5.1f}  {row['rps']:8.1f} req/s"
+        )
+
+    def compare(self, path, results):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)["results"]
+        self.stdout.write(f"Сравнение с {path}:")
+        for view, row in results.items():
+            if view not in previous:
+                continue
+            before = previous[view]
+            changes = "  ".join(
+                f"{key} {self.delta(before[key], row[key])}"
+                for key in ("p50_ms", "p95_ms", "queries_avg", "rps")
+            )
+            self.stdout.write(f"{view:<14} {changes}")
+
+    @staticmethod
+    def delta(before, after):
+        if not before:
+            return f"{after:.2f}"
+        return f"{(after - before) / before * 100:+.1f}%"
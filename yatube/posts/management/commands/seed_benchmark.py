@@ -0,0 +1,176 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import transfer
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу пользователями, группами, постами, комментариями "
+        "и подписками для нагрузочных замеров."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--comments", type=int, default=200000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="За сколько последних дней разбросать даты постов.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=None, help="Зерно генератора."
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.random = random.Random(options["seed"])
+        self.fake = Faker("ru_RU")
+        self.fake.seed_instance(options["seed"])
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options["days"])
+
+        prefix = f"bench{uuid.uuid4().hex[:8]}"
+        user_ids = self.seed_users(prefix, options["users"])
+        group_ids = self.seed_groups(prefix, options["groups"])
+        post_dates = self.seed_posts(user_ids, group_ids, options["posts"])
+        self.seed_comments(user_ids, post_dates, options["comments"])
+        self.seed_follows(user_ids, options["follows"])
+        self.refresh_derived_data()
+        self.stdout.write(self.style.SUCCESS("Данные сгенерированы."))
+
+    def bulk(self, model, objects, total, **kwargs):
+        """Создаёт объекты пачками, не держа в памяти больше одной пачки."""
+        batch = []
+        created = 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                created += self.flush(model, batch, **kwargs)
+                self.stdout.write(f"{model.__name__}: {created}/{total}")
+                batch = []
+        if batch:
+            created += self.flush(model, batch, **kwargs)
+            self.stdout.write(f"{model.__name__}: {created}/{total}")
+
+    @staticmethod
+    def flush(model, batch, **kwargs):
+        # Как при загрузке выгрузки: auto_now_add не затирает даты.
+        with transaction.atomic():
+            transfer.RawInsertQuerySet(model).bulk_create(batch, **kwargs)
+        return len(batch)
+
+    def moment_after(self, start):
+        """Случайный момент между start и текущим временем."""
+        seconds = (self.now - start).total_seconds()
+        return start + timedelta(seconds=self.random.uniform(0, seconds))
+
+    def seed_users(self, prefix, total):
+        self.bulk(
+            User,
+            (
+                User(
+                    username=f"{prefix}_{i}",
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                    password="!",
+                )
+                for i in range(total)
+            ),
+            total,
+        )
+        return list(
+            User.objects.filter(username__startswith=f"{prefix}_").values_list(
+                "id", flat=True
+            )
+        )
+
+    def seed_groups(self, prefix, total):
+        self.bulk(
+            Group,
+            (
+                Group(
+                    title=self.fake.sentence(nb_words=3)[:200],
+                    slug=f"{prefix}-{i}",
+                    description=self.fake.text(max_nb_chars=400),
+                )
+                for i in range(total)
+            ),
+            total,
+        )
+        return list(
+            Group.objects.filter(slug__startswith=f"{prefix}-").values_list(
+                "id", flat=True
+            )
+        )
+
+    def seed_posts(self, user_ids, group_ids, total):
+        last_id = Post.objects.order_by("-id").values_list("id", flat=True)
+        last_id = last_id.first() or 0
+        self.bulk(
+            Post,
+            (
+                Post(
+                    author_id=self.random.choice(user_ids),
+                    group_id=(
+                        self.random.choice(group_ids)
+                        if group_ids and self.random.random() < 0.7
+                        else None
+                    ),
+                    text=self.fake.text(max_nb_chars=400),
+                    pub_date=self.moment_after(self.start),
+                )
+                for _ in range(total)
+            ),
+            total,
+        )
+        return list(
+            Post.objects.filter(id__gt=last_id).values_list("id", "pub_date")
+        )
+
+    def seed_comments(self, user_ids, post_dates, total):
+        """Комментарии к постам из пар (id, pub_date), не раньше поста."""
+        if not post_dates:
+            return
+
+        def comment():
+            post_id, pub_date = self.random.choice(post_dates)
+            return Comment(
+                post_id=post_id,
+                author_id=self.random.choice(user_ids),
+                text=self.fake.sentence(),
+                created=self.moment_after(pub_date),
+            )
+
+        self.bulk(Comment, (comment() for _ in range(total)), total)
+
+    def seed_follows(self, user_ids, total):
+        total = min(total, len(user_ids) * (len(user_ids) - 1))
+        pairs = set()
+        while len(pairs) < total:
+            user_id, author_id = self.random.sample(user_ids, 2)
+            pairs.add((user_id, author_id))
+        self.bulk(
+            Follow,
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in pairs
+            ),
+            total,
+            ignore_conflicts=True,
+        )
+
+    def refresh_derived_data(self):
+        transfer.refresh_derived_data(self.batch_size, self.stdout.write)
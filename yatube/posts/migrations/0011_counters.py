@@ -0,0 +1,104 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Stats = apps.get_model("posts", "Stats")
+    Post = apps.get_model("posts", "Post")
+    Group = apps.get_model("posts", "Group")
+    users = User.objects.annotate(
+        posts_total=Count("posts", distinct=True),
+        comments_total=Count("comments", distinct=True),
+        followers_total=Count("following", distinct=True),
+        following_total=Count("follower", distinct=True),
+    )
+    Stats.objects.bulk_create(
+        Stats(
+            user_id=user.pk,
+            posts_count=user.posts_total,
+            comments_count=user.comments_total,
+            followers_count=user.followers_total,
+            following_count=user.following_total,
+        )
+        for user in users.iterator()
+    )
+    for post in Post.objects.annotate(total=Count("comments")).iterator():
+        if post.total:
+            Post.objects.filter(pk=post.pk).update(comments_count=post.total)
+    for group in Group.objects.annotate(total=Count("posts")).iterator():
+        Group.objects.filter(pk=group.pk).update(posts_count=group.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0011_update_proxy_permissions"),
+        ("posts", "0010_timelineentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Stats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                (
+                    "posts_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число постов"
+                    ),
+                ),
+                (
+                    "comments_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число комментариев"
+                    ),
+                ),
+                (
+                    "followers_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число подписчиков"
+                    ),
+                ),
+                (
+                    "following_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число подписок"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика",
+                "verbose_name_plural": "Статистика",
+            },
+        ),
+        migrations.AddField(
+            model_name="group",
+            name="posts_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Число постов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Число комментариев"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:40
+
+from django.db import migrations, models
+import posts.images
+import posts.storage
+
+
+def fill_refs(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    ImageRef = apps.get_model("posts", "ImageRef")
+    counts = {}
+    for field in ("image", "image_webp"):
+        rows = (
+            Post.objects.exclude(**{field: ""})
+            .order_by()
+            .values_list(field)
+            .annotate(total=models.Count("pk"))
+        )
+        for name, total in rows:
+            counts[name] = counts.get(name, 0) + total
+    ImageRef.objects.bulk_create(
+        [ImageRef(name=name, refs=total) for name, total in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_image_webp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRef',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('refs', models.IntegerField(default=0, verbose_name='Число ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Изменено')),
+            ],
+            options={
+                'verbose_name': 'Ссылки на картинку',
+                'verbose_name_plural': 'Ссылки на картинки',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', validators=[posts.images.validate], verbose_name='Картинка'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image_webp',
+            field=models.ImageField(blank=True, editable=False, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/webp/', verbose_name='Картинка WebP'),
+        ),
+        migrations.AddIndex(
+            model_name='imageref',
+            index=models.Index(fields=['refs', 'updated'], name='imageref_unused'),
+        ),
+        migrations.RunPython(fill_refs, migrations.RunPython.noop),
+    ]
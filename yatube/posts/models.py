@@ -1,15 +1,26 @@
 # posts/models.py
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from . import images
+from .storage import image_storage
+
 User = get_user_model()
 
+# Поля Post, файлы которых лежат в image_storage и учитываются в ImageRef.
+IMAGE_FIELDS = ("image", "image_webp")
+
 
 class Group(models.Model):
 
     title = models.CharField(max_length=200, verbose_name="Заголовок")
     slug = models.SlugField(unique=True, verbose_name="Краткое название")
     description = models.TextField(max_length=400, verbose_name="Описание")
+    posts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Число постов"
+    )
 
     class Meta:
         verbose_name = "Группа"
@@ -44,15 +55,108 @@ class Post(models.Model):
         related_name="posts",
         verbose_name="Автор",
     )
-    image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    image = models.ImageField(
+        "Картинка",
+        upload_to="posts/",
+        storage=image_storage,
+        blank=True,
+        validators=[images.validate],
+    )
+    image_webp = models.ImageField(
+        "Картинка WebP",
+        upload_to="posts/webp/",
+        storage=image_storage,
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Число комментариев"
+    )
+    thumbnails = models.TextField(
+        blank=True, editable=False, verbose_name="Адреса миниатюр"
+    )
+    version = models.PositiveIntegerField(
+        default=1, editable=False, verbose_name="Версия карточки"
+    )
+
     class Meta:
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+        # Индексы повторяют фильтры и сортировку лент в posts.views.
+        indexes = [
+            models.Index(fields=["-pub_date", "-id"], name="post_pub_date"),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="post_group_pub_date",
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="post_author_pub_date",
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        if self.image and not self.image._committed:
+            self.normalize_image()
+        elif not self.image:
+            self.image_webp = ""
+        # Версия входит в ключ кэша карточки поста: правка её сбрасывает.
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "version"}
+        super().save(*args, **kwargs)
+
+    def normalize_image(self):
+        """Сохраняет новую загрузку уменьшенной, без EXIF и в WebP."""
+        name, original, webp_name, webp = images.normalize(self.image.file)
+        self.image.save(name, original, save=False)
+        self.image_webp.save(webp_name, webp, save=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки нужна, чтобы при правке поста
+        # перенести его из счётчика старой группы в новую.
+        instance._loaded_group_id = instance.__dict__.get("group_id")
+        instance._loaded_image = instance.__dict__.get("image")
+        # Файлы на момент загрузки: по ним сигналы ведут счётчик ссылок
+        # ImageRef. Отложенные (.only/.defer) поля не известны.
+        instance._loaded_files = {
+            field: instance.__dict__[field]
+            for field in IMAGE_FIELDS
+            if field in instance.__dict__
+        }
+        return instance
+
+    @property
+    def thumbnail_urls(self):
+        """Заранее подготовленные миниатюры: имя геометрии -> адрес."""
+        return json.loads(self.thumbnails) if self.thumbnails else {}
+
+
+class ImageRef(models.Model):
+    """Число ссылок постов на файл из хранилища картинок."""
+
+    name = models.CharField(max_length=255, unique=True, verbose_name="Файл")
+    refs = models.IntegerField(default=0, verbose_name="Число ссылок")
+    updated = models.DateTimeField(auto_now=True, verbose_name="Изменено")
+
+    class Meta:
+        verbose_name = "Ссылки на картинку"
+        verbose_name_plural = "Ссылки на картинки"
+        indexes = [
+            models.Index(fields=["refs", "updated"], name="imageref_unused")
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refs})"
+
 
 class Comment(models.Model):
 
@@ -77,9 +181,14 @@ class Comment(models.Model):
     )
 
     class Meta:
-        ordering = ["-created"]
+        ordering = ["-created", "-id"]
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = [
+            models.Index(
+                fields=["post", "-created", "-id"], name="comment_post_created"
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -106,3 +215,68 @@ class Follow(models.Model):
                 fields=["user", "author"], name="unique follow"
             )
         ]
+
+
+class Stats(models.Model):
+    """Счётчики пользователя, поддерживаемые сигналами."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Пользователь",
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name="Число постов"
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, verbose_name="Число комментариев"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name="Число подписчиков"
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name="Число подписок"
+    )
+
+    class Meta:
+        verbose_name = "Статистика"
+        verbose_name_plural = "Статистика"
+
+    def __str__(self):
+        return f"{self.user}"
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора у подписчика."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Подписчик",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост",
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique timeline entry"
+            )
+        ]
+        indexes = [
+            # post — последний ключ сортировки ленты, как id у постов.
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="timeline_user_pub_date",
+            )
+        ]
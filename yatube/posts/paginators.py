@@ -0,0 +1,325 @@
+import base64
+import binascii
+import hashlib
+import json
+import math
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import (
+    EmptyPage,
+    Page,
+    PageNotAnInteger,
+    Paginator,
+)
+from django.db import connection, connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+from core import stampede
+from core.tasks import task
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+class CursorPage(Sequence):
+    """Страница keyset-пагинации: только ссылки «вперёд» и «назад»."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<Cursor page of {len(self.object_list)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Пагинация по ключу сортировки вместо COUNT(*) и OFFSET.
+
+    Курсор — непрозрачный токен со значениями полей ``ordering`` крайней
+    записи страницы, поэтому выборка любой страницы — это один запрос
+    с условием по индексу и LIMIT.
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-id")):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def encode_cursor(self, direction, item):
+        values = [
+            _serialize(self._value(item, name)) for name in self._names()
+        ]
+        raw = json.dumps([direction, values], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, значения) или None для плохого токена."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            direction, raw_values = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self._names(), raw_values)
+            ]
+        except (binascii.Error, TypeError, ValueError, UnicodeError):
+            return None
+        if direction not in (NEXT, PREVIOUS) or len(values) != len(
+            self.ordering
+        ):
+            return None
+        return direction, values
+
+    def page(self, cursor=None):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self._build(self._fetch(None, NEXT), NEXT, first=True)
+        direction, values = decoded
+        return self._build(self._fetch(values, direction), direction)
+
+    def get_page(self, cursor=None):
+        return self.page(cursor)
+
+    def _fetch(self, values, direction):
+        reverse = direction == PREVIOUS
+        queryset = self.object_list.order_by(*self._ordering(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse))
+        return list(queryset[: self.per_page + 1])
+
+    def _build(self, rows, direction, first=False):
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_next, has_previous = bool(rows), has_more
+        else:
+            has_next, has_previous = has_more, not first and bool(rows)
+        next_cursor = previous_cursor = None
+        if has_next:
+            next_cursor = self.encode_cursor(NEXT, rows[-1])
+        if has_previous:
+            previous_cursor = self.encode_cursor(PREVIOUS, rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _seek(self, values, reverse):
+        condition = Q()
+        equal = {}
+        for order, value in zip(self.ordering, values):
+            name = order.lstrip("-")
+            descending = order.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def _ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            order[1:] if order.startswith("-") else f"-{order}"
+            for order in self.ordering
+        )
+
+    def _names(self):
+        return [order.lstrip("-") for order in self.ordering]
+
+    def _field(self, name):
+        return self.object_list.model._meta.get_field(name)
+
+    @staticmethod
+    def _value(item, name):
+        if isinstance(item, dict):
+            return item[name]
+        return getattr(item, name)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator без COUNT(*) на каждый запрос.
+
+    Для выборки без условий число строк берётся из статистики
+    планировщика (sqlite_stat1 после ANALYZE, pg_class.reltuples), если
+    таблица не меньше PAGINATOR_EXACT_THRESHOLD строк: на таких объёмах
+    точность номера последней страницы не важна. Оценка только
+    показывается: страница выбирается по номеру без сверки с ней, а
+    ссылка «вперёд» есть, пока за страницей остаются строки, так что
+    устаревшая статистика не прячет последние страницы. Остальные выборки
+    считаются точно; если передана версия данных ``version``, результат
+    кэшируется по ней и тексту запроса на PAGINATOR_COUNT_TIMEOUT секунд.
+    """
+
+    def __init__(self, *args, version=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = version
+
+    @cached_property
+    def estimate(self):
+        """Число строк по статистике или None, если считать точно."""
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or not _unfiltered(
+            queryset.query
+        ):
+            return None
+        estimate = estimated_rows(queryset.model, queryset.db)
+        if estimate is None or estimate < settings.PAGINATOR_EXACT_THRESHOLD:
+            return None
+        return estimate
+
+    @property
+    def estimated(self):
+        return self.estimate is not None
+
+    @cached_property
+    def count(self):
+        if self.estimated:
+            return self.estimate
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or self.version is None:
+            return super().count
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        digest = hashlib.md5(f"{queryset.db}|{sql}|{params}".encode())
+        return stampede.get_or_set(
+            f"posts:count:{self.version}:{digest.hexdigest()}",
+            queryset.count,
+            settings.PAGINATOR_COUNT_TIMEOUT,
+        )
+
+    def validate_number(self, number):
+        if not self.estimated:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Номер за концом выборки, а оценка могла быть и больше, и
+            # меньше настоящего числа строк: последняя страница по COUNT(*).
+            last = math.ceil(self.object_list.count() / self.per_page)
+            return self.page(max(last, 1))
+
+    def page(self, number):
+        if not self.estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        # Лишняя строка показывает, есть ли следующая страница.
+        top = bottom + self.per_page + 1
+        rows = list(self.object_list[bottom:top])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        return EstimatedPage(
+            rows[: self.per_page],
+            number,
+            self,
+            has_next=len(rows) > self.per_page,
+        )
+
+
+class EstimatedPage(Page):
+    """Страница, которая знает о следующей по выборке, а не по оценке."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+def _unfiltered(query):
+    return not (
+        query.where
+        or query.distinct
+        or query.combinator
+        or query.low_mark
+        or query.high_mark is not None
+    )
+
+
+@task
+def analyze():
+    """
+    Обновляет статистику планировщика, по которой оцениваются таблицы.
+    Выполняется периодически (TASKS_PERIODIC).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def estimated_rows(model, using):
+    """Число строк таблицы по статистике базы или None, если её нет."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # sqlite_stat1 появляется только после первого ANALYZE.
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table]
+            )
+            # Первое число в stat — сколько строк в таблице или индексе.
+            return max(
+                (int(stat.split()[0]) for (stat,) in cursor.fetchall()),
+                default=None,
+            )
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = %s::regclass",
+                [table],
+            )
+            row = cursor.fetchone()
+            if row is not None and row[0] >= 0:
+                return row[0]
+    return None
+
+
+def _serialize(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
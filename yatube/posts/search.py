@@ -0,0 +1,184 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = "posts_post_fts"
+# Служебные символы вокруг совпадений. Из индексируемого текста они
+# удаляются, поэтому после экранирования их можно заменить на <mark>.
+MARK_START = "\x02"
+MARK_END = "\x03"
+WITHOUT_MARKS = str.maketrans("", "", MARK_START + MARK_END)
+SNIPPET_TOKENS = 16
+
+
+def available():
+    return connection.vendor == "sqlite"
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5."""
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def index_post(post):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)",
+            [post.pk, post.text.translate(WITHOUT_MARKS)],
+        )
+
+
+def unindex_post(post_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def unindex_posts(post_ids):
+    if not available() or not post_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+            [[post_id] for post_id in post_ids],
+        )
+
+
+def index_posts(post_ids):
+    """Переиндексирует перечисленные посты."""
+    if not available() or not post_ids:
+        return
+    posts = Post.objects.filter(pk__in=post_ids).values_list("id", "text")
+    rows = [(pk, text.translate(WITHOUT_MARKS)) for pk, text in posts]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+            [[post_id] for post_id in post_ids],
+        )
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)", rows
+        )
+
+
+def rebuild(batch_size=1000):
+    """Переиндексирует все посты пачками; отдаёт число готовых записей."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    done = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Post.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "text")[:batch_size]
+        )
+        if not batch:
+            break
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)",
+                [
+                    (post_id, text.translate(WITHOUT_MARKS))
+                    for post_id, text in batch
+                ],
+            )
+        done += len(batch)
+        last_id = batch[-1][0]
+        yield done
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, "<mark>")
+        .replace(MARK_END, "</mark>")
+    )
+
+
+class SearchResults:
+    """Ранжированная выдача FTS5, которую умеет листать Paginator."""
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+
+    def count(self):
+        if not self.expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [self.expression],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[slice(key, key + 1)][0]
+        start = key.start or 0
+        if not self.expression or key.stop is not None and key.stop <= start:
+            return []
+        limit = -1 if key.stop is None else key.stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', %s) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                "ORDER BY rank LIMIT %s OFFSET %s",
+                [
+                    MARK_START,
+                    MARK_END,
+                    SNIPPET_TOKENS,
+                    self.expression,
+                    limit,
+                    start,
+                ],
+            )
+            rows = cursor.fetchall()
+        posts = Post.objects.select_related("author", "group").in_bulk(
+            [post_id for post_id, _ in rows]
+        )
+        results = []
+        for post_id, snippet in rows:
+            post = posts.get(post_id)
+            if post is not None:
+                post.snippet = highlight(snippet)
+                results.append(post)
+        return results
+
+
+def filter_matching(queryset, query):
+    """Сужает queryset постов до совпадений FTS5 или возвращает None."""
+    expression = match_expression(query)
+    if not available() or not expression:
+        return None
+    return queryset.filter(
+        pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [expression],
+        )
+    )
+
+
+def search(query):
+    """Посты по запросу: FTS5 на SQLite, иначе поиск подстроки."""
+    if available():
+        return SearchResults(query)
+    return Post.objects.select_related("author", "group").filter(
+        text__icontains=query
+    )
@@ -0,0 +1,278 @@
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from . import counters, feeds, imagerefs, search, thumbnails, timeline
+from .caching import bump_posts_version, bump_user_versions
+from .models import (
+    IMAGE_FIELDS,
+    Comment,
+    Follow,
+    Group,
+    Post,
+    Stats,
+    User,
+)
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def unfollow_remove(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.author_id)
+    timeline.follower_left(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_pages(sender, instance, raw=False, **kwargs):
+    bump_user_versions([instance.user_id])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_follower_pages(sender, instance, raw=False, **kwargs):
+    # У популярных авторов followers() — None: их посты подмешиваются
+    # при чтении, и ключ ленты учитывает их по версии раздела автора.
+    bump_user_versions(timeline.followers(instance.author_id) or ())
+
+
+# Поля, которые видны в карточке поста и в записи ленты.
+CARD_FIELDS = {
+    User: ("username", "first_name", "last_name"),
+    Group: ("title", "slug"),
+}
+
+
+def _card_values(instance):
+    # Через __dict__: отложенное (.only/.defer) поле не подгружается.
+    return tuple(
+        instance.__dict__.get(field) for field in CARD_FIELDS[type(instance)]
+    )
+
+
+def _card_changed(instance):
+    """Изменились ли поля карточки с загрузки объекта из базы."""
+    return getattr(instance, "_loaded_card", None) != _card_values(instance)
+
+
+@receiver(post_init, sender=Group)
+@receiver(post_init, sender=User)
+def remember_card_values(sender, instance, **kwargs):
+    instance._loaded_card = _card_values(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def posts_changed(sender, instance, signal, created=False, **kwargs):
+    if sender is not Post and signal is post_save:
+        # Регистрация, вход, смена пароля или почты, правка описания
+        # группы лент постов не меняют. Как и feed_sources_changed,
+        # должен сработать до post_cards_changed.
+        if created or not _card_changed(instance):
+            return
+    bump_posts_version()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_feeds(sender, instance, raw=False, **kwargs):
+    # Должен сработать до post_count: тот обновляет _loaded_group_id.
+    group_ids = {
+        instance.group_id,
+        getattr(instance, "_loaded_group_id", None),
+    }
+    feeds.bump_scopes(
+        feeds.INDEX_SCOPE,
+        feeds.author_scope(instance.author_id),
+        *(feeds.group_scope(pk) for pk in group_ids if pk is not None),
+    )
+
+
+def _crossing_scopes(sender, instance):
+    """Разделы лент, где видно имя автора (группы) из чужого раздела."""
+    if sender is Group:
+        field, scope = "author_id", feeds.author_scope
+        posts = Post.objects.filter(group=instance)
+    else:
+        field, scope = "group_id", feeds.group_scope
+        posts = Post.objects.filter(author=instance)
+    ids = posts.order_by().values_list(field, flat=True).distinct()
+    return [scope(pk) for pk in ids if pk is not None]
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def feed_sources_changed(sender, instance, signal, created=False, **kwargs):
+    """В записях лент есть имя автора и название группы."""
+    if sender is Group:
+        scope = feeds.group_scope(instance.pk)
+    else:
+        scope = feeds.author_scope(instance.pk)
+    if signal is post_delete:
+        feeds.bump_scopes(feeds.INDEX_SCOPE, scope)
+        return
+    # Должен сработать до post_cards_changed: тот обновляет _loaded_card.
+    if not created and _card_changed(instance):
+        feeds.bump_scopes(
+            feeds.INDEX_SCOPE, scope, *_crossing_scopes(sender, instance)
+        )
+    elif sender is Group:
+        # Описание группы видно только в её собственной ленте.
+        feeds.bump_scopes(scope)
+
+
+@receiver(pre_delete, sender=Group)
+@receiver(pre_delete, sender=User)
+def feed_source_deleted(sender, instance, **kwargs):
+    # После удаления посты группы уже отвязаны, а посты автора удалены.
+    feeds.bump_scopes(*_crossing_scopes(sender, instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=User)
+def post_cards_changed(sender, instance, created, raw=False, **kwargs):
+    """Карточки показывают имя автора и название группы."""
+    changed = _card_changed(instance)
+    instance._loaded_card = _card_values(instance)
+    if created or raw or not changed:
+        # Вход пользователя, правка пароля или описания группы
+        # карточки не меняют: не переписываем все посты автора.
+        return
+    lookup = "group" if sender is Group else "author"
+    posts = Post.objects.filter(**{lookup: instance})
+    posts.update(version=F("version") + 1)
+    author_ids = posts.order_by().values_list("author_id", flat=True)
+    for author_id in author_ids.distinct():
+        # Ленты подписок помечены версиями пользователей. У популярных
+        # авторов followers() — None: их посты помечены версией раздела
+        # автора, а её сдвинул feed_sources_changed.
+        bump_user_versions(timeline.followers(author_id) or ())
+
+
+@receiver(post_save, sender=User)
+def user_create_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Stats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_count(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded_group_id = getattr(instance, "_loaded_group_id", None)
+    if created:
+        counters.bump_user(instance.author_id, create=True, posts_count=1)
+        counters.bump(Group, instance.group_id, posts_count=1)
+    elif loaded_group_id != instance.group_id:
+        counters.bump(Group, loaded_group_id, posts_count=-1)
+        counters.bump(Group, instance.group_id, posts_count=1)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_uncount(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    counters.bump(Group, instance.group_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(Post, instance.post_id, comments_count=1)
+        counters.bump_user(instance.author_id, create=True, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_uncount(sender, instance, **kwargs):
+    counters.bump(Post, instance.post_id, comments_count=-1)
+    counters.bump_user(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.user_id, create=True, following_count=1)
+        counters.bump_user(instance.author_id, create=True, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def unfollow_uncount(sender, instance, **kwargs):
+    counters.bump_user(instance.user_id, following_count=-1)
+    counters.bump_user(instance.author_id, followers_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def post_image_refs(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = {} if created else getattr(instance, "_loaded_files", {})
+    current = _image_names(instance)
+    for field, name in current.items():
+        if created or field in loaded:
+            if name != (loaded.get(field) or ""):
+                imagerefs.acquire(name)
+                imagerefs.release(loaded.get(field))
+    instance._loaded_files = current
+
+
+@receiver(post_delete, sender=Post)
+def post_image_unref(sender, instance, **kwargs):
+    for name in _image_names(instance).values():
+        imagerefs.release(name)
+
+
+def _image_names(post):
+    # Отложенные поля не читаем: это лишний запрос на каждый пост.
+    return {
+        field: getattr(post, field).name or ""
+        for field in IMAGE_FIELDS
+        if field in post.__dict__
+    }
+
+
+@receiver(post_save, sender=Post)
+def post_thumbnails(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    image = instance.image.name or ""
+    loaded_image = getattr(instance, "_loaded_image", None) or ""
+    if not created and image == loaded_image:
+        return
+    instance._loaded_image = image
+    if instance.thumbnails:
+        instance.thumbnails = ""
+        Post.objects.filter(pk=instance.pk).update(thumbnails="")
+    thumbnails.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "text" in update_fields:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_unindex(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
@@ -0,0 +1,249 @@
+# posts/sitemaps.py
+import json
+import os
+import zlib
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Group, Post, User
+
+INDEX_FILE = "sitemap.xml"
+MANIFEST_FILE = "manifest.json"
+URLSET_START = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+)
+URLSET_END = "</urlset>\n"
+INDEX_START = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+)
+INDEX_END = "</sitemapindex>\n"
+# Подставляется в reverse() вместо id/slug/username, чтобы не вызывать
+# reverse() для каждой из миллионов строк.
+URL_MARKER = 7364823917
+
+
+class Section:
+    """
+    Раздел карты сайта. Шард — диапазон первичных ключей размером
+    shard_size, поэтому объект всегда попадает в один и тот же файл.
+    """
+
+    name = None
+    model = None
+    url_name = None
+    url_field = None
+
+    def queryset(self):
+        return self.model.objects.all()
+
+    def aggregates(self):
+        return {"count": Count("pk"), "ids": Sum("pk")}
+
+    def fingerprints(self, shard_size, chunk_size=2000):
+        """Сводка по каждому шарду: номер -> сводка."""
+        rows = (
+            self.queryset()
+            .annotate(shard=F("pk") / shard_size)
+            .order_by("shard")
+            .values("shard")
+            .annotate(**self.aggregates())
+        )
+        fingerprints = {str(row.pop("shard")): row for row in rows}
+        if self.url_field != "id":
+            checksums = self.url_checksums(shard_size, chunk_size)
+            for shard, checksum in checksums.items():
+                fingerprints[shard]["urls"] = checksum
+        return fingerprints
+
+    def url_checksums(self, shard_size, chunk_size):
+        """
+        Контрольная сумма адресов каждого шарда: переименованный slug или
+        username не меняет ни числа строк, ни суммы ключей. Переносимой
+        хеш-функции в SQL нет, поэтому пары (ключ, значение) читаются
+        потоком; XOR от порядка строк не зависит.
+        """
+        checksums = {}
+        rows = (
+            self.queryset()
+            .order_by()
+            .values_list("pk", self.url_field)
+            .iterator(chunk_size=chunk_size)
+        )
+        for pk, value in rows:
+            shard = str(pk // shard_size)
+            checksum = zlib.crc32(f"{pk}:{value}".encode())
+            checksums[shard] = checksums.get(shard, 0) ^ checksum
+        return checksums
+
+    def rows(self, shard, shard_size, chunk_size):
+        start = int(shard) * shard_size
+        return (
+            self.queryset()
+            .filter(pk__gte=start, pk__lt=start + shard_size)
+            .order_by("pk")
+            .values_list(self.url_field, *self.extra_fields())
+            .iterator(chunk_size=chunk_size)
+        )
+
+    def extra_fields(self):
+        return ()
+
+    def url_format(self, base_url):
+        path = reverse(self.url_name, args=[URL_MARKER])
+        return base_url + path.replace(str(URL_MARKER), "{}")
+
+    def entry(self, url_format, row):
+        loc = url_format.format(quote(str(row[0])))
+        return f"<url><loc>{escape(loc)}</loc></url>\n"
+
+
+class PostsSection(Section):
+    name = "posts"
+    model = Post
+    url_name = "posts:post_detail"
+    url_field = "id"
+
+    def aggregates(self):
+        # Сумма версий меняется при правке любого поста шарда.
+        return {**super().aggregates(), "versions": Sum("version")}
+
+    def extra_fields(self):
+        return ("pub_date",)
+
+    def entry(self, url_format, row):
+        loc = escape(url_format.format(row[0]))
+        return (
+            f"<url><loc>{loc}</loc>"
+            f"<lastmod>{row[1]:%Y-%m-%d}</lastmod></url>\n"
+        )
+
+
+class GroupsSection(Section):
+    name = "groups"
+    model = Group
+    url_name = "posts:group_list"
+    url_field = "slug"
+
+
+class ProfilesSection(Section):
+    name = "profiles"
+    model = User
+    url_name = "posts:profile"
+    url_field = "username"
+
+
+SECTIONS = (PostsSection(), GroupsSection(), ProfilesSection())
+
+
+def shard_file(section, shard):
+    return f"sitemap-{section}-{shard}.xml"
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_FILE)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_atomic(path, chunks):
+    """Пишет файл по частям во временный и подменяет им старый."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as output:
+        for chunk in chunks:
+            output.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def build(root, base_url, shard_size, chunk_size=2000, full=False):
+    """
+    Обновляет шарды, изменившиеся с прошлого запуска, и индекс.
+
+    Для каждого шарда в manifest.json хранится сводка (число объектов,
+    сумма ключей, для постов — ещё и сумма версий, для групп и профилей —
+    контрольная сумма slug и username). Шард
+    переписывается, только если сводка изменилась; строки читаются
+    потоком через values_list().iterator() и сразу пишутся в файл.
+    Генератор возвращает (раздел, шард) каждого переписанного файла.
+    """
+    os.makedirs(root, exist_ok=True)
+    old_manifest = {} if full else load_manifest(root)
+    if old_manifest.get("shard_size") != shard_size:
+        old_manifest = {}
+    manifest = {"shard_size": shard_size, "sections": {}}
+    now = timezone.now().isoformat()
+
+    for section in SECTIONS:
+        url_format = section.url_format(base_url)
+        old_shards = old_manifest.get("sections", {}).get(section.name, {})
+        shards = {}
+        fingerprints = section.fingerprints(shard_size, chunk_size)
+        for shard, fingerprint in fingerprints.items():
+            old = old_shards.get(shard)
+            path = os.path.join(root, shard_file(section.name, shard))
+            if (
+                old is not None
+                and old["fingerprint"] == fingerprint
+                and os.path.exists(path)
+            ):
+                shards[shard] = old
+                continue
+            rows = section.rows(shard, shard_size, chunk_size)
+            write_atomic(
+                path,
+                _urlset((section.entry(url_format, row) for row in rows)),
+            )
+            shards[shard] = {"fingerprint": fingerprint, "lastmod": now}
+            yield section.name, shard
+        for shard in old_shards.keys() - shards.keys():
+            path = os.path.join(root, shard_file(section.name, shard))
+            if os.path.exists(path):
+                os.remove(path)
+        manifest["sections"][section.name] = shards
+
+    write_atomic(os.path.join(root, INDEX_FILE), _index(manifest, base_url))
+    write_atomic(
+        os.path.join(root, MANIFEST_FILE), [json.dumps(manifest, indent=2)]
+    )
+
+
+def _urlset(entries):
+    yield URLSET_START
+    yield from entries
+    yield URLSET_END
+
+
+def _index(manifest, base_url):
+    yield INDEX_START
+    for section, shards in manifest["sections"].items():
+        for shard in sorted(shards, key=int):
+            loc = escape(
+                base_url + reverse("posts:sitemap", args=[section, int(shard)])
+            )
+            lastmod = shards[shard]["lastmod"]
+            yield (
+                f"<sitemap><loc>{loc}</loc>"
+                f"<lastmod>{lastmod}</lastmod></sitemap>\n"
+            )
+    yield INDEX_END
+
+
+def serve(request, section=None, shard=None):
+    """Отдаёт готовый файл: карты строит команда build_sitemaps."""
+    if section is None:
+        name = INDEX_FILE
+    else:
+        name = shard_file(section, shard)
+    path = os.path.join(settings.SITEMAP_ROOT, name)
+    if not os.path.exists(path):
+        raise Http404("Карта сайта ещё не построена.")
+    return FileResponse(open(path, "rb"), content_type="application/xml")
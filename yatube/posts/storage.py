@@ -0,0 +1,69 @@
+# posts/storage.py
+"""
+Хранилище картинок постов по хешу содержимого.
+
+Имя файла — sha256 его байтов, поэтому одинаковые картинки (репосты
+мемов) занимают один файл и делят один набор миниатюр sorl: ключ
+миниатюры строится по имени исходника. Кто ссылается на файл, считает
+таблица ImageRef (posts.imagerefs), а удаляет ненужные файлы команда
+collect_images.
+"""
+
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage, который кладёт файл в
+    <папка upload_to>/<первые два символа хеша>/<хеш><расширение>.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя зависит только от содержимого и выбирается в
+        # _save(); суффиксы против совпадений здесь не нужны.
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        tmp_path = self.path(posixpath.join(directory, f".{uuid.uuid4().hex}"))
+        digest = hashlib.sha256()
+        # Хеш считается по ходу записи: файл читается один раз, целиком
+        # в памяти не держится.
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with os.fdopen(fd, "wb") as output:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:2], hexdigest + extension
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                # Свежее время изменения защищает файл от сборщика,
+                # пока новая ссылка на него ещё не записана в ImageRef.
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,13 @@
+# posts/templatetags/post_cards.py
+from django import template
+
+from posts.caching import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    request = context.get("request")
+    match = getattr(request, "resolver_match", None)
+    return render_cards(posts, match.view_name if match else None)
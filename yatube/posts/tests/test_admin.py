@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, Stats, User
+from ..search import search
+from .utils import data_queries, run_on_commit
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "a@a.ru", "pass")
+        cls.auth = User.objects.create_user(username="auth")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.groups = [
+            Group.objects.create(
+                title=f"Группа {number}",
+                slug=f"group-{number}",
+                description="Описание",
+            )
+            for number in range(3)
+        ]
+        cls.posts = [
+            Post.objects.create(
+                author=cls.auth,
+                text=f"Пост номер {number}",
+                group=cls.groups[number % 3],
+            )
+            for number in range(6)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text="Комментарий"
+        )
+        cls.url = reverse("admin:posts_post_changelist")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        with run_on_commit():
+            for _ in range(6):
+                Post.objects.create(
+                    author=self.reader, text="Ещё пост", group=self.groups[0]
+                )
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context["cl"].result_list), 12)
+        self.assertEqual(len(data_queries(many)), len(data_queries(few)))
+
+    def test_search_uses_full_text_index(self):
+        response = self.client.get(self.url, {"q": "номер 4"})
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.posts[4]]
+        )
+
+    def test_bulk_delete_keeps_derived_data(self):
+        selected = [self.posts[0].pk, self.posts[3].pk]
+        self.client.post(
+            self.url,
+            {
+                "action": "delete_selected",
+                "_selected_action": selected,
+                "post": "yes",
+            },
+        )
+        self.assertFalse(Post.objects.filter(pk__in=selected).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.groups[0].refresh_from_db()
+        self.assertEqual(self.groups[0].posts_count, 0)
+        self.assertEqual(Stats.objects.get(user=self.auth).posts_count, 4)
+        self.assertEqual(Stats.objects.get(user=self.reader).comments_count, 0)
+        self.assertEqual(len(search("номер 3")), 0)
+
+    def test_remove_from_group_action(self):
+        self.client.post(
+            self.url,
+            {
+                "action": "remove_from_group",
+                "_selected_action": [self.posts[1].pk, self.posts[4].pk],
+            },
+        )
+        self.groups[1].refresh_from_db()
+        self.assertEqual(self.groups[1].posts_count, 0)
+        self.assertEqual(self.groups[1].posts.count(), 0)
+        self.posts[1].refresh_from_db()
+        self.assertEqual(self.posts[1].version, 2)
@@ -0,0 +1,109 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from .utils import DataQueriesMixin
+
+
+class ApiViewsTest(DataQueriesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(
+            username="auth", first_name="Лев", last_name="Толстой"
+        )
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="test-slug",
+            description="Тестовое описание",
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.auth, text=f"Пост {number}", group=cls.group
+            )
+            for number in range(13)
+        ]
+        cls.comment = Comment.objects.create(
+            author=cls.reader, post=cls.posts[0], text="Комментарий"
+        )
+        Follow.objects.create(user=cls.reader, author=cls.auth)
+
+    def test_posts_are_paginated_by_cursor(self):
+        """Лента отдаётся по курсору без создания моделей."""
+        url = reverse("posts:api_index")
+        with self.assertNumDataQueries(1):
+            first = self.client.get(url).json()
+        second = self.client.get(url, {"cursor": first["next"]}).json()
+        ids = [post["id"] for post in first["results"] + second["results"]]
+        self.assertEqual(ids, [post.id for post in reversed(self.posts)])
+        self.assertIsNone(second["next"])
+        self.assertEqual(
+            first["results"][0],
+            {
+                "id": self.posts[-1].id,
+                "text": "Пост 12",
+                "pub_date": first["results"][0]["pub_date"],
+                "author": "auth",
+                "group": "test-slug",
+                "image": None,
+                "image_webp": None,
+                "comments_count": 0,
+            },
+        )
+
+    def test_group_profile_and_detail(self):
+        group = self.client.get(
+            reverse("posts:api_group_list", args=["test-slug"])
+        ).json()
+        self.assertEqual(group["group"]["posts_count"], 13)
+
+        profile = self.client.get(
+            reverse("posts:api_profile", args=["auth"])
+        ).json()
+        self.assertEqual(profile["author"]["full_name"], "Лев Толстой")
+        self.assertEqual(profile["author"]["followers_count"], 1)
+
+        detail = self.client.get(
+            reverse("posts:api_post_detail", args=[self.posts[0].id])
+        ).json()
+        self.assertEqual(detail["post"]["comments_count"], 1)
+        self.assertEqual(
+            [comment["text"] for comment in detail["comments"]["results"]],
+            ["Комментарий"],
+        )
+
+    def test_missing_objects_return_json_404(self):
+        urls = (
+            reverse("posts:api_group_list", args=["missing"]),
+            reverse("posts:api_profile", args=["missing"]),
+            reverse("posts:api_post_detail", args=[0]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn("detail", response.json())
+
+    def test_follow_feed_requires_login(self):
+        url = reverse("posts:api_follow_index")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        first = self.client.get(url).json()
+        self.assertEqual(len(first["results"]), 10)
+        second = self.client.get(url, {"cursor": first["next"]}).json()
+        ids = [post["id"] for post in first["results"] + second["results"]]
+        self.assertEqual(ids, [post.id for post in reversed(self.posts)])
+        back = self.client.get(url, {"cursor": second["previous"]}).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_export_streams_all_posts(self):
+        response = self.client.get(
+            reverse("posts:api_export"), {"group": "test-slug"}
+        )
+        self.assertTrue(response.streaming)
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            [row["id"] for row in rows], [post.id for post in self.posts]
+        )
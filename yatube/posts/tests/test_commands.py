@@ -0,0 +1,354 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db.models import F, Max, Min
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import transfer
+from ..models import (
+    Comment,
+    Follow,
+    Group,
+    ImageRef,
+    Post,
+    Stats,
+    TimelineEntry,
+    User,
+)
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_benchmark_creates_consistent_data(self):
+        """Сгенерированные данные сразу согласованы со счётчиками и лентами."""
+        call_command(
+            "seed_benchmark",
+            users=10,
+            groups=2,
+            posts=50,
+            comments=30,
+            follows=15,
+            batch_size=20,
+            seed=1,
+            stdout=StringIO(),
+        )
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertEqual(Follow.objects.count(), 15)
+        self.assertEqual(
+            sum(Stats.objects.values_list("posts_count", flat=True)), 50
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_seed_benchmark_spreads_dates(self):
+        """Посты разбросаны по времени, комментарии не старше постов."""
+        call_command(
+            "seed_benchmark",
+            users=5,
+            groups=1,
+            posts=20,
+            comments=20,
+            follows=5,
+            days=30,
+            seed=2,
+            stdout=StringIO(),
+        )
+        dates = Post.objects.aggregate(
+            first=Min("pub_date"), last=Max("pub_date")
+        )
+        self.assertGreater(dates["last"] - dates["first"], timedelta(days=1))
+        self.assertFalse(
+            Comment.objects.filter(created__lt=F("post__pub_date")).exists()
+        )
+
+    def test_run_benchmark_saves_json(self):
+        call_command(
+            "seed_benchmark",
+            users=5,
+            groups=1,
+            posts=20,
+            comments=5,
+            follows=5,
+            seed=2,
+            stdout=StringIO(),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "result.json")
+            call_command(
+                "run_benchmark",
+                requests=3,
+                warmup=1,
+                output=output,
+                stdout=StringIO(),
+            )
+            with open(output) as result_file:
+                results = json.load(result_file)["results"]
+        self.assertEqual(
+            set(results),
+            {"index", "group_list", "profile", "post_detail", "follow_index"},
+        )
+        for row in results.values():
+            self.assertEqual(row["requests"], 3)
+            self.assertLessEqual(row["p50_ms"], row["p99_ms"])
+
+
+class SitemapCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username="auth")
+        cls.group = Group.objects.create(
+            title="Группа", slug="test-slug", description="Описание"
+        )
+        cls.posts = [
+            Post.objects.create(author=cls.auth, text=f"Пост {number}")
+            for number in range(5)
+        ]
+
+    def build(self, root):
+        output = StringIO()
+        call_command(
+            "build_sitemaps",
+            root=root,
+            base_url="http://testserver",
+            shard_size=2,
+            stdout=output,
+        )
+        return output.getvalue()
+
+    def test_only_changed_shards_are_rewritten(self):
+        with tempfile.TemporaryDirectory() as root:
+            output = self.build(root)
+            shards = {
+                f"sitemap-posts-{post.pk // 2}.xml" for post in self.posts
+            }
+            for name in shards | {"sitemap.xml", "sitemap-groups-0.xml"}:
+                with self.subTest(name=name):
+                    self.assertTrue(os.path.exists(os.path.join(root, name)))
+            self.assertIn(f"перезаписано шардов: {len(shards) + 2}", output)
+
+            post = self.posts[0]
+            post.text = "Правка"
+            post.save()
+            self.assertIn("перезаписано шардов: 1", self.build(root))
+
+            deleted_pk = self.posts[1].pk
+            shard = deleted_pk // 2
+            self.posts[1].delete()
+            self.build(root)
+            with open(os.path.join(root, "sitemap.xml")) as index:
+                self.assertIn("sitemap-posts-", index.read())
+
+            with override_settings(SITEMAP_ROOT=root):
+                response = self.client.get(
+                    reverse("posts:sitemap", args=["posts", shard])
+                )
+            content = b"".join(response.streaming_content).decode()
+            self.assertIn(f"/posts/{self.posts[2].pk}/", content)
+            self.assertNotIn(f"/posts/{deleted_pk}/", content)
+
+    def test_renamed_urls_are_rewritten(self):
+        """Новый slug или username меняют сводку своего шарда."""
+        with tempfile.TemporaryDirectory() as root:
+            self.build(root)
+            self.group.slug = "new-slug"
+            self.group.save()
+            self.assertIn("перезаписано шардов: 1", self.build(root))
+            with open(os.path.join(root, "sitemap-groups-0.xml")) as shard:
+                self.assertIn("/group/new-slug/", shard.read())
+
+            self.auth.username = "renamed"
+            self.auth.save()
+            self.build(root)
+            name = f"sitemap-profiles-{self.auth.pk // 2}.xml"
+            with open(os.path.join(root, name)) as shard:
+                self.assertIn("/profile/renamed/", shard.read())
+
+
+class TransferCommandsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "seed_benchmark",
+            users=6,
+            groups=2,
+            posts=30,
+            comments=20,
+            follows=8,
+            seed=3,
+            stdout=StringIO(),
+        )
+
+    def snapshot(self):
+        return {
+            "posts": set(
+                Post.objects.values_list(
+                    "author__username", "group__slug", "text", "pub_date"
+                )
+            ),
+            "comments": set(
+                Comment.objects.values_list(
+                    "post__text", "author__username", "text", "created"
+                )
+            ),
+            "follows": set(
+                Follow.objects.values_list(
+                    "user__username", "author__username"
+                )
+            ),
+        }
+
+    def test_ndjson_round_trip(self):
+        """Выгрузка, загруженная в пустую базу, даёт те же данные."""
+        before = self.snapshot()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dump.ndjson")
+            call_command(
+                "export_yatube", output=path, chunk_size=7, stdout=StringIO()
+            )
+            User.objects.all().delete()
+            Group.objects.all().delete()
+            call_command(
+                "import_yatube", path, batch_size=4, stdout=StringIO()
+            )
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(
+            sum(Stats.objects.values_list("posts_count", flat=True)), 30
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_csv_posts_are_imported_with_offset(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "posts.csv")
+            call_command(
+                "export_yatube",
+                format="csv",
+                kind=["posts"],
+                output=path,
+                stdout=StringIO(),
+            )
+            last_id = Post.objects.order_by("-id").first().id
+            call_command(
+                "import_yatube",
+                path,
+                format="csv",
+                kind="posts",
+                post_id_offset=last_id,
+                stdout=StringIO(),
+            )
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Post.objects.filter(id__gt=last_id).count(), 30)
+
+    def test_import_keeps_dates_of_live_posts(self):
+        """Загрузка не выключает auto_now_add у постов других запросов."""
+        author = User.objects.first()
+        live = []
+
+        def records():
+            yield "posts", {
+                "id": 1000,
+                "author": author.username,
+                "text": "Старый пост",
+                "pub_date": "2001-02-03T04:05:06+00:00",
+            }
+            live.append(Post.objects.create(author=author, text="Новый"))
+            yield "posts", {
+                "id": 1001,
+                "author": author.username,
+                "text": "Ещё старый пост",
+                "pub_date": "2001-02-03T04:05:07+00:00",
+            }
+
+        list(transfer.Importer(batch_size=1).run(records()))
+        self.assertEqual(Post.objects.get(pk=1000).pub_date.year, 2001)
+        self.assertEqual(Post.objects.get(pk=1001).pub_date.year, 2001)
+        self.assertGreater(live[0].pub_date.year, 2001)
+
+    def test_failed_import_refreshes_loaded_part(self):
+        """Пачки до ошибки попадают в счётчики, хотя команда упала."""
+        author = User.objects.first()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dump.ndjson")
+            with open(path, "w", encoding="utf-8") as output:
+                for number in range(2):
+                    row = {
+                        "type": "posts",
+                        "id": 1000 + number,
+                        "author": author.username,
+                        "text": "Загружен",
+                        "pub_date": "2001-02-03T04:05:06+00:00",
+                    }
+                    output.write(json.dumps(row) + "\n")
+                output.write(json.dumps({"type": "unknown"}) + "\n")
+            posts_count = Stats.objects.get(user=author).posts_count
+            with self.assertRaises(CommandError):
+                call_command(
+                    "import_yatube", path, batch_size=1, stdout=StringIO()
+                )
+        self.assertEqual(
+            Stats.objects.get(user=author).posts_count, posts_count + 1
+        )
+
+    def test_imported_images_are_referenced(self):
+        """Картинки загруженных постов не достаются сборщику мусора."""
+        Post.objects.filter(pk__in=Post.objects.values("pk")[:2]).update(
+            image="posts/ab/imported.png"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dump.ndjson")
+            call_command("export_yatube", output=path, stdout=StringIO())
+            User.objects.all().delete()
+            Group.objects.all().delete()
+            ImageRef.objects.all().delete()
+            call_command("import_yatube", path, stdout=StringIO())
+        self.assertEqual(
+            ImageRef.objects.get(name="posts/ab/imported.png").refs, 2
+        )
+
+    def test_existing_rows_are_not_counted_as_imported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dump.ndjson")
+            call_command(
+                "export_yatube",
+                kind=["users", "groups", "follows"],
+                output=path,
+                stdout=StringIO(),
+            )
+            output = StringIO()
+            call_command("import_yatube", path, stdout=output)
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(Follow.objects.count(), 8)
+        self.assertNotIn("users: 6", output.getvalue())
+        self.assertIn("users: пропущено 6", output.getvalue())
+        self.assertIn("follows: пропущено 8", output.getvalue())
+
+    def test_refresh_touches_only_imported_rows(self):
+        """После загрузки пересчитываются только затронутые строки."""
+        author, other = User.objects.all()[:2]
+        Stats.objects.filter(user=other).update(posts_count=100)
+        importer = transfer.Importer(batch_size=10)
+        list(
+            importer.run(
+                [
+                    (
+                        "posts",
+                        {
+                            "id": 1000,
+                            "author": author.username,
+                            "text": "Загружен",
+                            "pub_date": "2001-02-03T04:05:06+00:00",
+                        },
+                    )
+                ]
+            )
+        )
+        importer.refresh(lambda message: None)
+        self.assertEqual(
+            Stats.objects.get(user=author).posts_count,
+            Post.objects.filter(author=author).count(),
+        )
+        self.assertEqual(Stats.objects.get(user=other).posts_count, 100)
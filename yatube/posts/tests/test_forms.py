@@ -1,14 +1,17 @@
 # posts/tests/test_forms.py
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
-from ..models import Comment, Group, Post
+from .. import imagerefs
+from ..models import Comment, Group, ImageRef, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -80,7 +83,146 @@ class PostFormTests(TestCase):
         self.assertEqual(Post.objects.count(), posts_count + 1)
         post = Post.objects.latest("pk")
         self.assertEqual(post.text, PostFormTests.post_1.text)
-        self.assertEqual(post.image, f"posts/{image_name}")
+        self.assertRegex(post.image.name, r"^posts/\w{2}/\w{64}\.gif$")
+
+    @override_settings(POST_IMAGE_MAX_SIZE=(400, 400))
+    def test_uploaded_image_is_normalized(self):
+        """Картинка уменьшается, теряет EXIF и получает WebP-вариант."""
+        exif = Image.Exif()
+        exif[0x0110] = "Камера"
+        buffer = BytesIO()
+        Image.new("RGB", (1200, 800), "red").save(
+            buffer, "JPEG", exif=exif
+        )
+        uploaded = SimpleUploadedFile(
+            "photo.jpeg", buffer.getvalue(), content_type="image/jpeg"
+        )
+        self.authorized_client_auth.post(
+            reverse("posts:post_create"),
+            data={"text": "Фото", "image": uploaded},
+        )
+        post = Post.objects.latest("pk")
+        self.assertRegex(post.image.name, r"^posts/\w{2}/\w{64}\.jpg$")
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (400, 267))
+            self.assertNotIn("exif", image.info)
+        with Image.open(post.image_webp.path) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.size, (400, 267))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_oversized_image_is_rejected(self):
+        buffer = BytesIO()
+        Image.new("RGB", (20, 20)).save(buffer, "PNG")
+        uploaded = SimpleUploadedFile(
+            "big.png", buffer.getvalue(), content_type="image/png"
+        )
+        posts_count = Post.objects.count()
+        response = self.authorized_client_auth.post(
+            reverse("posts:post_create"),
+            data={"text": "Большая", "image": uploaded},
+        )
+        self.assertFormError(
+            response, "form", "image", "Слишком большое изображение: 20×20."
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    @staticmethod
+    def animation(name, size, frames):
+        buffer = BytesIO()
+        first, *rest = [
+            Image.new("RGB", size, color)
+            for color in ("red", "green", "blue", "white")[:frames]
+        ]
+        first.save(
+            buffer, "GIF", save_all=True, append_images=rest, duration=50
+        )
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    @override_settings(POST_IMAGE_MAX_SIZE=(100, 100))
+    def test_animation_is_resized_frame_by_frame(self):
+        """Кадры анимации уменьшаются так же, как обычная картинка."""
+        uploaded = self.animation("a.gif", (400, 200), 3)
+        self.authorized_client_auth.post(
+            reverse("posts:post_create"),
+            data={"text": "Гифка", "image": uploaded},
+        )
+        post = Post.objects.latest("pk")
+        for field in (post.image, post.image_webp):
+            with self.subTest(name=field.name):
+                with Image.open(field.path) as image:
+                    self.assertEqual(image.size, (100, 50))
+                    self.assertEqual(image.n_frames, 3)
+
+    @override_settings(POST_IMAGE_MAX_FRAMES=2)
+    def test_long_animation_is_rejected(self):
+        uploaded = self.animation("a.gif", (8, 8), 3)
+        response = self.authorized_client_auth.post(
+            reverse("posts:post_create"),
+            data={"text": "Гифка", "image": uploaded},
+        )
+        self.assertFormError(
+            response,
+            "form",
+            "image",
+            "Слишком длинная анимация: больше 2 кадров.",
+        )
+
+    @override_settings(POST_IMAGE_MAX_ANIMATION_PIXELS=150)
+    def test_large_animation_is_rejected(self):
+        uploaded = self.animation("a.gif", (8, 8), 3)
+        response = self.authorized_client_auth.post(
+            reverse("posts:post_create"),
+            data={"text": "Гифка", "image": uploaded},
+        )
+        self.assertFormError(
+            response,
+            "form",
+            "image",
+            "Слишком большая анимация: уменьшите кадры или их число.",
+        )
+
+    def test_identical_images_share_one_file(self):
+        """Повторная загрузка не копирует файл; он живёт, пока нужен."""
+        buffer = BytesIO()
+        Image.new("RGB", (30, 20), "blue").save(buffer, "PNG")
+        posts = []
+        for name in ("meme.png", "repost.png"):
+            self.authorized_client_auth.post(
+                reverse("posts:post_create"),
+                data={
+                    "text": name,
+                    "image": SimpleUploadedFile(name, buffer.getvalue()),
+                },
+            )
+            posts.append(Post.objects.latest("pk"))
+        first, second = posts
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_webp.name, second.image_webp.name)
+        name = first.image.name
+        self.assertEqual(ImageRef.objects.get(name=name).refs, 2)
+
+        first.delete()
+        self.assertEqual(ImageRef.objects.get(name=name).refs, 1)
+        self.assertEqual(imagerefs.collect(grace=0), [])
+        second.image = ""
+        second.save()
+        self.assertEqual(ImageRef.objects.get(name=name).refs, 0)
+        self.assertTrue(second.image.storage.exists(name))
+        self.assertEqual(imagerefs.collect(grace=3600), [])
+
+        removed = imagerefs.collect(grace=-1)
+        self.assertIn(name, removed)
+        self.assertFalse(second.image.storage.exists(name))
+        self.assertFalse(ImageRef.objects.filter(name=name).exists())
+
+    def test_unreferenced_image_gets_no_row_on_release(self):
+        """Удаление неучтённой картинки не делает её мусором."""
+        name = "posts/ab/uncounted.png"
+        imagerefs.release(name)
+        self.assertFalse(ImageRef.objects.filter(name=name).exists())
+        imagerefs.acquire(name)
+        self.assertEqual(ImageRef.objects.get(name=name).refs, 1)
 
     def test_create_post_without_group(self):
         """Валидная форма создает запись в Post без указания группы."""
@@ -1,8 +1,15 @@
 # posts/tests/test_models.py
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, Stats
+from ..paginators import CursorPaginator
+from ..timeline import timeline
 
 User = get_user_model()
 
@@ -79,3 +86,157 @@ class PostsModelsTest(TestCase):
                     PostsModelsTest.post._meta.get_field(field).help_text,
                     expected_value,
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        cls.other_group = Group.objects.create(
+            title="Другая", slug="other", description="Описание"
+        )
+
+    def stats(self, user):
+        return Stats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики обновляются при создании и удалении объектов."""
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        comment = Comment.objects.create(
+            author=self.reader, post=post, text="Комментарий"
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.reader).comments_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+
+        follow.delete()
+        comment.delete()
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).comments_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_group_change_moves_post_count(self):
+        post = Post.objects.create(
+            author=self.author, text="Пост", group=self.group
+        )
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+    def test_uncounted_objects_can_be_deleted(self):
+        """Удаление того, что не попало в счётчики, не уводит их ниже нуля."""
+        Post.objects.bulk_create(
+            [Post(author=self.author, text="Пост", group=self.group)]
+        )
+        post = Post.objects.get(author=self.author)
+        Comment.objects.bulk_create(
+            [Comment(author=self.reader, post=post, text="Комментарий")]
+        )
+        Comment.objects.get(post=post).delete()
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.reader).comments_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_recount_stats_fixes_drift(self):
+        """Команда recount_stats пересчитывает счётчики с нуля."""
+        Post.objects.bulk_create(
+            [Post(author=self.author, text="Пост", group=self.group)] * 3
+        )
+        Stats.objects.filter(user=self.author).update(followers_count=7)
+        call_command("recount_stats", stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.group.posts_count, 3)
+
+
+class FeedQueryPlanTest(TestCase):
+    """Запросы лент читают индекс, а не сканируют и сортируют таблицу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text="Пост", group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def query_plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset):
+        self.assertPlanUsesIndex(
+            self.query_plan(*queryset.query.sql_with_params())
+        )
+
+    def assertPlanUsesIndex(self, plan):
+        for step in plan:
+            with self.subTest(step=step):
+                self.assertNotRegex(step, r"^SCAN (TABLE )?\w+$")
+                self.assertNotIn("TEMP B-TREE", step)
+
+    def test_feed_queries_use_indexes(self):
+        cursor_filter = CursorPaginator(Post.objects.all(), 10)._seek(
+            [self.post.pub_date, self.post.id], reverse=False
+        )
+        feeds = {
+            "index": Post.objects.all(),
+            "group_list": self.group.posts.all(),
+            "profile": self.author.posts.all(),
+            "comments": self.post.comments.all(),
+            "index_cursor": Post.objects.filter(cursor_filter),
+            "group_cursor": self.group.posts.filter(cursor_filter),
+            "profile_cursor": self.author.posts.filter(cursor_filter),
+        }
+        if connection.vendor != "sqlite":
+            self.skipTest("План запроса проверяется только для SQLite.")
+        for name, queryset in feeds.items():
+            with self.subTest(feed=name):
+                self.assertUsesIndex(queryset[:10])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_feed_reads_timeline_index(self):
+        """
+        Лента подписок читает записи по индексу ленты, а посты популярных
+        авторов — по индексу автора; ни одна выборка не сортируется.
+        """
+        if connection.vendor != "sqlite":
+            self.skipTest("План запроса проверяется только для SQLite.")
+        popular = User.objects.create_user(username="popular")
+        fan = User.objects.create_user(username="fan")
+        Follow.objects.create(user=self.reader, author=popular)
+        Follow.objects.create(user=fan, author=popular)
+        popular_post = Post.objects.create(author=popular, text="Новый")
+        with CaptureQueriesContext(connection) as context:
+            posts = timeline(self.reader).select_related("author")[:10]
+        self.assertEqual(posts, [popular_post, self.post])
+        for query in context.captured_queries:
+            with self.subTest(sql=query["sql"]):
+                self.assertPlanUsesIndex(self.query_plan(query["sql"]))
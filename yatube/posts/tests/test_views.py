@@ -1,16 +1,28 @@
 # posts/tests/test_views.py
 import shutil
 import tempfile
+import time
+from io import StringIO
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 
-from ..models import Comment, Follow, Group, Post
+from core import tasks
+
+from .. import caching, feeds, search, thumbnails
+from ..caching import posts_version
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..paginators import EstimatedCountPaginator
+from .utils import DataQueriesMixin, run_on_commit
 
 User = get_user_model()
 
@@ -18,7 +30,7 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostsViewTests(TestCase):
+class PostsViewTests(DataQueriesMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -136,9 +148,7 @@ class PostsViewTests(TestCase):
             response.context.get("post").group: PostsViewTests.group,
             response.context.get("post").image: PostsViewTests.post.image,
             response.context.get("post").author: PostsViewTests.auth,
-            response.context.get("comments").latest(
-                "pk"
-            ): PostsViewTests.comment,
+            response.context.get("comments")[0]: PostsViewTests.comment,
             response.context.get(
                 "posts_count"
             ): PostsViewTests.auth.posts.count(),
@@ -192,15 +202,182 @@ class PostsViewTests(TestCase):
                 form_field = response.context.get("form").fields.get(value)
                 self.assertIsInstance(form_field, expected)
 
+    @override_settings(COMMENTS_ON_PAGE=2)
+    def test_comments_are_paginated(self):
+        """Комментарии приходят страницами, остальные — через фрагмент."""
+        post = Post.objects.create(author=PostsViewTests.auth, text="Пост")
+        comments = [
+            Comment.objects.create(
+                author=PostsViewTests.auth, post=post, text=f"Коммент {i}"
+            )
+            for i in range(3)
+        ]
+        response = self.client.get(
+            reverse("posts:post_detail", kwargs={"post_id": post.id})
+        )
+        first_page = response.context["comments"]
+        self.assertEqual(list(first_page), comments[:0:-1])
+        self.assertTrue(first_page.has_next())
+
+        url = reverse("posts:comments", kwargs={"post_id": post.id})
+        with self.assertNumDataQueries(2):
+            response = self.client.get(
+                url, {"cursor": first_page.next_cursor}
+            )
+        self.assertTemplateUsed(response, "posts/includes/comments.html")
+        self.assertEqual(list(response.context["comments"]), comments[:1])
+        self.assertContains(response, "Коммент 0")
+        self.assertNotContains(response, "Коммент 1")
+
+    def test_thumbnails_are_pregenerated(self):
+        """Миниатюры готовятся заранее, и шаблон берёт готовый адрес."""
+        urls = thumbnails.generate(PostsViewTests.post.id)
+        post = Post.objects.get(pk=PostsViewTests.post.id)
+        self.assertEqual(post.thumbnail_urls, urls)
+        self.assertIn("card", urls)
+        response = self.client.get(
+            reverse("posts:post_detail", kwargs={"post_id": post.id})
+        )
+        self.assertContains(response, urls["card"])
+
     def test_cache_is_work(self):
-        """Кэш используется."""
-        content1 = self.client.get(reverse("posts:index")).content
-        Post.objects.latest("pk").delete()
+        """Страница главной берётся из кэша без запросов к постам."""
+        self.client.get(reverse("posts:index"))
+        with self.assertNumDataQueries(0):
+            self.client.get(reverse("posts:index"))
+
+    def test_cache_is_invalidated_on_delete(self):
+        """Удаление поста сбрасывает кэш главной страницы."""
+        post = Post.objects.create(
+            author=PostsViewTests.auth, text="Пост для удаления"
+        )
+        with run_on_commit():
+            content1 = self.client.get(reverse("posts:index")).content
+            post.delete()
+            # Пока транзакция не закоммичена, версия прежняя.
+            self.assertEqual(
+                self.client.get(reverse("posts:index")).content, content1
+            )
         content2 = self.client.get(reverse("posts:index")).content
-        self.assertEqual(content1, content2)
+        self.assertIn(post.text.encode(), content1)
+        self.assertNotIn(post.text.encode(), content2)
+
+    def test_post_cards_are_cached_by_version(self):
+        """Карточка берётся из кэша, пока не изменится версия поста."""
+        url = reverse("posts:group_list", args=[PostsViewTests.group.slug])
+        self.client.get(url)
+        Post.objects.filter(pk=PostsViewTests.post.pk).update(text="Тихо")
+        self.assertNotContains(self.client.get(url), "Тихо")
+
+        post = Post.objects.get(pk=PostsViewTests.post.pk)
+        post.text = "Правка"
+        post.save()
+        self.assertContains(self.client.get(url), "Правка")
+
+        PostsViewTests.auth.first_name = "Новое имя"
+        PostsViewTests.auth.save()
+        self.assertContains(self.client.get(url), "Новое имя")
+
+    def test_post_versions_follow_only_card_fields(self):
+        """Посты автора переписываются, только если изменилась карточка."""
+        post = Post.objects.get(pk=PostsViewTests.post.pk)
+        version = posts_version()
+        index_version = caching.version(
+            feeds.scope_version_key(feeds.INDEX_SCOPE)
+        )
+        user = User.objects.get(pk=PostsViewTests.auth.pk)
+        with run_on_commit():
+            User.objects.create_user(username="newcomer")
+            user.set_password("new-password")
+            user.save()
+            user.email = "auth@example.com"
+            user.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).version, post.version)
+        self.assertEqual(posts_version(), version)
+        self.assertEqual(
+            caching.version(feeds.scope_version_key(feeds.INDEX_SCOPE)),
+            index_version,
+        )
+
+        user.last_name = "Новая фамилия"
+        user.save()
+        self.assertEqual(
+            Post.objects.get(pk=post.pk).version, post.version + 1
+        )
+        user.save()
+        self.assertEqual(
+            Post.objects.get(pk=post.pk).version, post.version + 1
+        )
+
+    def test_conditional_get(self):
+        """Неизменившиеся страницы отдаются как 304 Not Modified."""
+        post = PostsViewTests.post
+        urls = (
+            reverse("posts:index"),
+            reverse("posts:group_list", args=[PostsViewTests.group.slug]),
+            reverse("posts:profile", args=[PostsViewTests.auth.username]),
+            reverse("posts:post_detail", args=[post.pk]),
+        )
+        etags = {}
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etags[url] = response["ETag"]
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 304)
+
+        with run_on_commit():
+            Post.objects.get(pk=post.pk).save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 200)
+
+        url = reverse("posts:post_detail", args=[post.pk])
+        response = self.client.get(url)
+        self.assertFalse(response.has_header("Last-Modified"))
+        # Правка не меняет дат: If-Modified-Since не должен давать 304.
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.authorized_client_auth.get(
+            url, HTTP_IF_NONE_MATCH=etags[url]
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_etag_follows_form_and_commenters(self):
+        """Новый CSRF-токен и новое имя комментатора дают 200, а не 304."""
+        client = self.authorized_client_auth
+        url = reverse("posts:post_detail", args=[PostsViewTests.post.pk])
+        commenter = User.objects.create_user(username="commenter")
+        Comment.objects.create(
+            post=PostsViewTests.post, author=commenter, text="Коммент"
+        )
+        # Первый ответ ставит cookie с CSRF-токеном.
+        client.get(url)
+        etag = client.get(url)["ETag"]
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+        # Так выглядит токен после повторного входа.
+        client.cookies[settings.CSRF_COOKIE_NAME] = "a" * 64
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
 
+        commenter.username = "renamed"
+        commenter.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "renamed")
 
-class PaginatorViewsTest(TestCase):
+
+class PaginatorViewsTest(DataQueriesMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -243,6 +420,83 @@ class PaginatorViewsTest(TestCase):
             response = self.client.get(reverse_name + "?page=2")
             self.assertEqual(len(response.context["page_obj"]), 3)
 
+    def test_cursor_pages_contain_all_records(self):
+        """Курсорная пагинация проходит ленту вперёд и назад."""
+        for reverse_name in PaginatorViewsTest.urls:
+            with self.subTest(reverse_name=reverse_name):
+                cache.clear()
+                response = self.client.get(reverse_name + "?cursor=")
+                first_page = response.context["page_obj"]
+                self.assertEqual(len(first_page), 10)
+                self.assertFalse(first_page.has_previous())
+
+                response = self.client.get(
+                    reverse_name + f"?cursor={first_page.next_cursor}"
+                )
+                second_page = response.context["page_obj"]
+                self.assertEqual(len(second_page), 3)
+                self.assertFalse(second_page.has_next())
+                self.assertFalse(
+                    set(first_page.object_list)
+                    & set(second_page.object_list)
+                )
+
+                response = self.client.get(
+                    reverse_name + f"?cursor={second_page.previous_cursor}"
+                )
+                self.assertEqual(
+                    response.context["page_obj"].object_list,
+                    first_page.object_list,
+                )
+
+    def test_broken_cursor_returns_first_page(self):
+        cache.clear()
+        response = self.client.get(reverse("posts:index") + "?cursor=xyz")
+        self.assertEqual(len(response.context["page_obj"]), 10)
+
+    @override_settings(PAGINATOR_EXACT_THRESHOLD=5)
+    def test_large_tables_are_counted_from_statistics(self):
+        """Большая таблица не считается COUNT(*), выборка — из кэша."""
+        cache.clear()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+        self.assertEqual(paginator.count, 13)
+        self.assertTrue(paginator.estimated)
+
+        filtered = Post.objects.filter(group=self.group)
+        paginator = EstimatedCountPaginator(filtered, 10, version=1)
+        self.assertEqual(paginator.count, 13)
+        with self.assertNumDataQueries(0):
+            paginator = EstimatedCountPaginator(filtered, 10, version=1)
+            self.assertEqual(paginator.count, 13)
+        self.assertFalse(paginator.estimated)
+
+        admin = User.objects.create_superuser("admin", "a@a.ru", "pass")
+        self.client.force_login(admin)
+        response = self.client.get(reverse("admin:posts_post_changelist"))
+        self.assertTrue(response.context["cl"].paginator.estimated)
+
+    @override_settings(PAGINATOR_EXACT_THRESHOLD=5)
+    def test_stale_estimate_does_not_hide_pages(self):
+        """Оценка меньше настоящего числа строк: страницы всё равно есть."""
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        Post.objects.bulk_create(
+            Post(text=f"Новый пост {number}", author=self.auth)
+            for number in range(20)
+        )
+        paginator = EstimatedCountPaginator(
+            Post.objects.order_by("-pub_date", "-id"), 10
+        )
+        self.assertEqual(paginator.num_pages, 2)
+        self.assertTrue(paginator.get_page(2).has_next())
+        last_page = paginator.get_page(4)
+        self.assertEqual(last_page.number, 4)
+        self.assertEqual(len(last_page), 3)
+        self.assertFalse(last_page.has_next())
+        self.assertEqual(paginator.get_page(9).number, 4)
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -320,3 +574,255 @@ class FollowViewsTest(TestCase):
         )
         posts_objects = response.context["page_obj"]
         self.assertFalse(FollowViewsTest.post in posts_objects)
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика."""
+        post = Post.objects.create(author=FollowViewsTest.auth, text="Новый")
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=FollowViewsTest.user, post=post
+            ).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(
+                user=FollowViewsTest.another_user, post=post
+            ).exists()
+        )
+
+    def test_unfollow_clears_timeline(self):
+        """После отписки посты автора уходят из ленты."""
+        self.authorized_client_user.get(
+            reverse(
+                "posts:profile_unfollow",
+                kwargs={"username": f"{FollowViewsTest.auth.username}"},
+            )
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=FollowViewsTest.user).exists()
+        )
+
+    @override_settings(TIMELINE_DEPTH=2)
+    def test_timeline_is_trimmed(self):
+        for i in range(3):
+            Post.objects.create(author=FollowViewsTest.auth, text=f"{i}")
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=FollowViewsTest.user).count(), 2
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_posts_are_pulled(self):
+        """Посты популярного автора читаются на лету, без записи в ленты."""
+        post = Post.objects.create(author=FollowViewsTest.auth, text="Хит")
+        self.assertFalse(post.timeline_entries.exists())
+        response = self.authorized_client_user.get(
+            reverse("posts:follow_index")
+        )
+        self.assertIn(post, response.context["page_obj"])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TASKS_EAGER=False)
+    def test_posts_are_backfilled_when_author_is_no_longer_popular(self):
+        """Автор снова обычный: его посты раскладываются по лентам."""
+        Follow.objects.create(
+            user=FollowViewsTest.another_user, author=FollowViewsTest.auth
+        )
+        post = Post.objects.create(author=FollowViewsTest.auth, text="Хит")
+        self.assertFalse(post.timeline_entries.exists())
+        Follow.objects.filter(user=FollowViewsTest.another_user).delete()
+        tasks.run_pending()
+        self.assertTrue(
+            post.timeline_entries.filter(user=FollowViewsTest.user).exists()
+        )
+        response = self.authorized_client_user.get(
+            reverse("posts:follow_index")
+        )
+        self.assertEqual(response.context["page_obj"][0], post)
+
+    def test_follow_feed_is_cached_per_user(self):
+        """Лента подписок берётся из кэша, пока не изменится её версия."""
+        url = reverse("posts:follow_index")
+        profile_url = reverse("posts:profile", args=["auth"])
+        client = self.authorized_client_user
+        client.get(url)
+        self.assertTrue(client.get(profile_url).context["following"])
+        with run_on_commit():
+            Post.objects.create(
+                author=FollowViewsTest.another_user, text="Чужой"
+            )
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        self.assertFalse(
+            any("timelineentry" in query["sql"] for query in queries)
+        )
+
+        author = User.objects.get(pk=FollowViewsTest.auth.pk)
+        with run_on_commit():
+            author.first_name = "Переименован"
+            author.save()
+        self.assertContains(client.get(url), "Переименован")
+
+        with run_on_commit():
+            post = Post.objects.create(
+                author=FollowViewsTest.auth, text="Новый"
+            )
+        self.assertIn(post, client.get(url).context["page_obj"])
+        with run_on_commit():
+            client.get(reverse("posts:profile_unfollow", args=["auth"]))
+        self.assertEqual(len(client.get(url).context["page_obj"]), 0)
+        self.assertFalse(client.get(profile_url).context["following"])
+
+    def test_follow_feed_shows_renamed_group(self):
+        group = Group.objects.create(title="Группа", slug="group")
+        Post.objects.create(
+            author=FollowViewsTest.auth, text="В группе", group=group
+        )
+        url = reverse("posts:follow_index")
+        self.assertContains(self.authorized_client_user.get(url), "Группа")
+        with run_on_commit():
+            group.title = "Новое название"
+            group.save()
+        self.assertContains(
+            self.authorized_client_user.get(url), "Новое название"
+        )
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username="auth")
+        cls.cat_post = Post.objects.create(
+            author=cls.auth, text="Мой рыжий котик спит на диване"
+        )
+        cls.dog_post = Post.objects.create(
+            author=cls.auth, text="Собака гуляет во дворе"
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse("posts:search"), {"q": query})
+        return list(response.context["page_obj"])
+
+    def test_search_finds_matching_posts(self):
+        """Поиск находит посты по словам и префиксам с подсветкой."""
+        results = self.search("рыжий кот")
+        self.assertEqual(results, [SearchViewsTest.cat_post])
+        self.assertIn("<mark>рыжий</mark>", results[0].snippet)
+
+    def test_search_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(author=SearchViewsTest.auth, text="Ёжик")
+        post.text = "Енот"
+        post.save()
+        self.assertEqual(self.search("Ёжик"), [])
+        self.assertEqual(self.search("Енот"), [post])
+        post.delete()
+        self.assertEqual(self.search("Енот"), [])
+
+    def test_search_escapes_user_input(self):
+        """Спецсимволы запроса и текста поста не ломают выдачу."""
+        post = Post.objects.create(
+            author=SearchViewsTest.auth, text="<script>alert(1)</script>"
+        )
+        results = self.search('"script*(')
+        self.assertEqual(results, [post])
+        self.assertNotIn("<script>", results[0].snippet)
+
+    def test_search_marks_in_text_are_not_highlighted(self):
+        """Служебные символы подсветки из текста поста не дают разметки."""
+        post = Post.objects.create(
+            author=SearchViewsTest.auth, text="Ёжик \x03<b>жирный</b>\x02"
+        )
+        results = self.search("Ёжик")
+        self.assertEqual(results, [post])
+        self.assertEqual(results[0].snippet.count("</mark>"), 1)
+        self.assertNotIn("<b>", results[0].snippet)
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        self.assertEqual(self.search("Собака"), [])
+        call_command("rebuild_search_index", batch_size=1, stdout=StringIO())
+        self.assertEqual(self.search("Собака"), [SearchViewsTest.dog_post])
+
+
+class FeedsTest(DataQueriesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.auth = User.objects.create_user(username="auth")
+        cls.group = Group.objects.create(
+            title="Тестовая группа", slug="test-slug", description="Описание"
+        )
+        cls.another_group = Group.objects.create(
+            title="Другая группа", slug="another-slug", description="Описание"
+        )
+        cls.post = Post.objects.create(
+            author=cls.auth, text="Пост для ленты", group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_are_rendered(self):
+        urls = (
+            reverse("posts:feed"),
+            reverse("posts:feed_atom"),
+            reverse("posts:group_feed", args=[self.group.slug]),
+            reverse("posts:group_feed_atom", args=[self.group.slug]),
+            reverse("posts:profile_feed", args=[self.auth.username]),
+            reverse("posts:profile_feed_atom", args=[self.auth.username]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), self.post.text)
+        response = self.client.get(reverse("posts:group_feed", args=["no"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_cache_is_invalidated_per_scope(self):
+        """Новый пост сбрасывает только ленты своих разделов."""
+        group_url = reverse("posts:group_feed", args=[self.group.slug])
+        another_url = reverse(
+            "posts:group_feed", args=[self.another_group.slug]
+        )
+        self.client.get(group_url)
+        self.client.get(another_url)
+        with self.assertNumDataQueries(1):
+            self.client.get(group_url)
+
+        with run_on_commit():
+            Post.objects.create(
+                author=self.auth, text="Новый пост", group=self.group
+            )
+            # До коммита версия раздела прежняя.
+            self.assertNotContains(self.client.get(group_url), "Новый пост")
+        self.assertContains(self.client.get(group_url), "Новый пост")
+        with self.assertNumDataQueries(1):
+            response = self.client.get(another_url)
+        self.assertNotContains(response, "Новый пост")
+
+    def test_renames_reach_feeds_of_other_scopes(self):
+        """Имя автора и название группы меняются и в чужих лентах."""
+        group_url = reverse("posts:group_feed", args=[self.group.slug])
+        profile_url = reverse("posts:profile_feed", args=[self.auth.username])
+        self.client.get(group_url)
+        self.client.get(profile_url)
+
+        author = User.objects.get(pk=self.auth.pk)
+        with run_on_commit():
+            author.first_name = "Новое имя"
+            author.save()
+        self.assertContains(self.client.get(group_url), "Новое имя")
+
+        group = Group.objects.get(pk=self.group.pk)
+        with run_on_commit():
+            group.title = "Новое название"
+            group.save()
+        self.assertContains(self.client.get(profile_url), "Новое название")
+
+        with run_on_commit():
+            group.delete()
+        self.assertNotContains(self.client.get(profile_url), "Новое название")
+
+    def test_feed_honours_if_modified_since(self):
+        url = reverse("posts:feed")
+        response = self.client.get(url)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import CaptureQueriesContext
+
+from core.models import CacheEntry
+
+# Точки сохранения ставят и транзакции общего кэша.
+SAVEPOINTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+def data_queries(context):
+    """Запросы к данным: обращения к общему кэшу в таблице не в счёт."""
+    return [
+        query["sql"]
+        for query in context.captured_queries
+        if CacheEntry._meta.db_table not in query["sql"]
+        and not query["sql"].startswith(SAVEPOINTS)
+    ]
+
+
+class DataQueriesMixin:
+    @contextmanager
+    def assertNumDataQueries(self, num):
+        """assertNumQueries() без запросов общего кэша."""
+        with CaptureQueriesContext(connection) as context:
+            yield
+        queries = data_queries(context)
+        self.assertEqual(len(queries), num, "\n".join(queries))
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """
+    Выполняет обработчики transaction.on_commit(), поставленные внутри
+    блока: TestCase откатывает транзакцию, и сами они не сработают.
+    """
+    database = connections[using]
+    start = len(database.run_on_commit)
+    yield
+    # Откат точки сохранения заменяет список, поэтому он читается заново.
+    while len(database.run_on_commit) > start:
+        _, callback = database.run_on_commit.pop(start)
+        callback()
@@ -0,0 +1,37 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import F
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import enqueue, task
+
+from .models import Post
+
+
+@task
+def generate(post_id):
+    """Готовит все миниатюры POST_THUMBNAILS и сохраняет их адреса."""
+    post = Post.objects.filter(pk=post_id).only("id", "image").first()
+    if post is None or not post.image:
+        return {}
+    urls = {
+        name: get_thumbnail(post.image, geometry, **options).url
+        for name, (geometry, options) in settings.POST_THUMBNAILS.items()
+    }
+    # Картинку могли заменить, пока шла обработка: тогда адреса устарели.
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=json.dumps(urls), version=F("version") + 1
+    )
+    return urls
+
+
+def schedule(post):
+    """Ставит подготовку миниатюр в очередь задач."""
+    try:
+        if not post.image or not post.image.storage.exists(post.image.name):
+            return
+    except SuspiciousFileOperation:
+        return
+    enqueue(generate, post.pk)
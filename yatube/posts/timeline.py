@@ -0,0 +1,274 @@
+import hashlib
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Q, Subquery
+
+from core.tasks import enqueue, task
+
+from .caching import bump_user_versions, user_version, version
+from .feeds import author_scope, scope_version_key
+from .models import Follow, Post, Stats, TimelineEntry
+
+
+def popular_authors():
+    """Авторы, чьи посты не раскладываются по лентам, а читаются на лету."""
+    return Stats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values("user_id")
+
+
+def followers(author_id):
+    """
+    Подписчики автора или None, если их больше TIMELINE_FANOUT_LIMIT:
+    посты такого автора в ленты не раскладываются.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    follower_ids = list(
+        Follow.objects.filter(author_id=author_id).values_list(
+            "user_id", flat=True
+        )[: limit + 1]
+    )
+    if len(follower_ids) > limit:
+        return None
+    return follower_ids
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    follower_ids = followers(post.author_id)
+    if follower_ids is None:
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in follower_ids
+        ],
+        ignore_conflicts=True,
+    )
+    trim(follower_ids)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        "-pub_date", "-id"
+    )[: settings.TIMELINE_DEPTH]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts.values_list("id", "pub_date")
+        ],
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(author__following__user_id=user_id).order_by(
+        "-pub_date", "-id"
+    )[: settings.TIMELINE_DEPTH]
+    TimelineEntry.objects.bulk_create(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.values_list("id", "pub_date")
+    )
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def follower_left(author_id):
+    """
+    После отписки: если у автора снова ровно TIMELINE_FANOUT_LIMIT
+    подписчиков, его посты больше не подмешиваются при чтении, и их
+    нужно разложить по лентам оставшихся подписчиков.
+    """
+    follower_ids = followers(author_id)
+    if (
+        follower_ids is not None
+        and len(follower_ids) == settings.TIMELINE_FANOUT_LIMIT
+    ):
+        enqueue(backfill_followers, author_id)
+
+
+@task
+def backfill_followers(author_id):
+    """Раскладывает посты автора по лентам всех его подписчиков."""
+    follower_ids = followers(author_id)
+    if follower_ids is None:
+        # Пока задача ждала очереди, автор снова стал популярным.
+        return
+    for user_id in follower_ids:
+        backfill(user_id, author_id)
+    bump_user_versions(follower_ids)
+
+
+def trim(user_ids):
+    """Обрезает ленты до TIMELINE_DEPTH последних записей."""
+    depth = settings.TIMELINE_DEPTH
+    cutoff = (
+        TimelineEntry.objects.filter(user_id=OuterRef("user_id"))
+        .order_by("-pub_date")
+        .values("pub_date")[depth:][:1]
+    )
+    TimelineEntry.objects.filter(
+        user_id__in=user_ids, pub_date__lte=Subquery(cutoff)
+    ).delete()
+
+
+def timeline(user):
+    """Посты ленты подписок: материализованная часть и популярные авторы."""
+    pulled = Follow.objects.filter(
+        user=user, author_id__in=popular_authors()
+    ).values_list("author_id", flat=True)
+    return Timeline(user.pk, list(pulled))
+
+
+class Timeline:
+    """
+    Лента подписок — слияние источников, упорядоченных по (-pub_date, -id).
+
+    Материализованная часть читается из TimelineEntry по индексу ленты,
+    посты каждого популярного автора — по индексу (author, -pub_date,
+    -id); для среза [:n] из каждого источника берётся не больше n строк,
+    так что ни одна выборка не сортируется. Запись ленты может остаться
+    и у автора, ставшего популярным: одинаковые ключи идут в слиянии
+    подряд и отбрасываются. Сами посты дочитываются по первичному ключу.
+
+    Поддерживает то, что нужно пагинаторам и API: filter() с условием
+    курсора, order_by() по ключу ленты или обратному, select_related(),
+    values(), count() и срезы.
+    """
+
+    model = Post
+    ordered = True
+    ORDERING = ("-pub_date", "-id")
+    REVERSED = ("pub_date", "id")
+
+    def __init__(self, user_id, author_ids, posts=None, condition=None):
+        self.user_id = user_id
+        self.author_ids = author_ids
+        self.posts = Post.objects.all() if posts is None else posts
+        self.condition = Q() if condition is None else condition
+        self.reverse = False
+
+    def _clone(self, **changes):
+        clone = Timeline(
+            self.user_id, self.author_ids, self.posts, self.condition
+        )
+        clone.reverse = self.reverse
+        for name, value in changes.items():
+            setattr(clone, name, value)
+        return clone
+
+    def filter(self, condition):
+        return self._clone(condition=self.condition & condition)
+
+    def order_by(self, *ordering):
+        if ordering not in (self.ORDERING, self.REVERSED):
+            raise ValueError(f"Лента не сортируется по {ordering}.")
+        return self._clone(reverse=ordering == self.REVERSED)
+
+    def select_related(self, *fields):
+        return self._clone(posts=self.posts.select_related(*fields))
+
+    def values(self, *fields):
+        return self._clone(posts=self.posts.values(*fields))
+
+    def _entries(self):
+        return TimelineEntry.objects.filter(
+            _on_entries(self.condition), user_id=self.user_id
+        )
+
+    def _pulled(self, author_ids):
+        return Post.objects.filter(self.condition, author_id__in=author_ids)
+
+    def count(self):
+        entries = self._entries()
+        if self.author_ids:
+            entries = entries.exclude(post__author_id__in=self.author_ids)
+            return entries.count() + self._pulled(self.author_ids).count()
+        return entries.count()
+
+    def _keys(self, limit):
+        """Первые limit ключей (pub_date, id) ленты без повторов."""
+        prefix = "" if self.reverse else "-"
+        sources = [
+            self._entries()
+            .order_by(f"{prefix}pub_date", f"{prefix}post_id")
+            .values_list("pub_date", "post_id")[:limit]
+        ]
+        sources += [
+            self._pulled([author_id])
+            .order_by(f"{prefix}pub_date", f"{prefix}id")
+            .values_list("pub_date", "id")[:limit]
+            for author_id in self.author_ids
+        ]
+        keys = []
+        for key in heapq.merge(*sources, reverse=not self.reverse):
+            if keys and keys[-1] == key:
+                continue
+            keys.append(key)
+            if len(keys) == limit:
+                break
+        return keys
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError("Лента поддерживает только срезы без шага.")
+        start = key.start or 0
+        ids = [pk for _, pk in self._keys(key.stop)[start:]]
+        rows = {
+            row["id"] if isinstance(row, dict) else row.pk: row
+            for row in self.posts.filter(pk__in=ids).order_by()
+        }
+        return [rows[pk] for pk in ids if pk in rows]
+
+
+def _on_entries(condition):
+    """Условие на поля поста -> то же условие на поля записи ленты."""
+    renamed = Q()
+    renamed.connector = condition.connector
+    renamed.negated = condition.negated
+    for child in condition.children:
+        if isinstance(child, Q):
+            renamed.children.append(_on_entries(child))
+            continue
+        lookup, value = child
+        if lookup == "id" or lookup.startswith("id__"):
+            lookup = f"post_{lookup}"
+        renamed.children.append((lookup, value))
+    return renamed
+
+
+def feed_version(user):
+    """
+    Версия ленты подписок для ключа кэша. Версию пользователя сдвигают
+    подписки и посты авторов, разложенные по его ленте; посты популярных
+    авторов учитываются по версиям их разделов лент.
+    """
+    pulled = Follow.objects.filter(
+        user=user, author_id__in=popular_authors()
+    ).values_list("author_id", flat=True)
+    parts = [user_version(user.pk)]
+    parts += [version(scope_version_key(author_scope(pk))) for pk in pulled]
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def is_following(user, author_id):
+    """Подписан ли user на автора; ответ кэшируется до смены подписок."""
+    key = f"posts:user:{user.pk}:{user_version(user.pk)}:follows:{author_id}"
+    following = cache.get(key)
+    if following is None:
+        following = Follow.objects.filter(
+            user=user, author_id=author_id
+        ).exists()
+        cache.set(key, following, settings.POSTS_PAGE_CACHE_TIMEOUT)
+    return following
@@ -0,0 +1,373 @@
+# posts/transfer.py
+"""Потоковые выгрузка и загрузка данных Yatube в NDJSON и CSV."""
+
+import csv
+import json
+
+from django.db import models, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feeds, imagerefs, paginators, search, timeline
+from .caching import bump_posts_version
+from .models import Comment, Follow, Group, Post, User
+
+NDJSON = "ndjson"
+CSV = "csv"
+FORMATS = (NDJSON, CSV)
+
+# Вид записи -> поля выгрузки -> пути в .values_list(). Пользователи и
+# группы ссылаются друг на друга по username и slug, посты — по id.
+KINDS = {
+    "users": {
+        "model": User,
+        "fields": {
+            "username": "username",
+            "first_name": "first_name",
+            "last_name": "last_name",
+            "email": "email",
+            "date_joined": "date_joined",
+        },
+    },
+    "groups": {
+        "model": Group,
+        "fields": {
+            "slug": "slug",
+            "title": "title",
+            "description": "description",
+        },
+    },
+    "posts": {
+        "model": Post,
+        "fields": {
+            "id": "id",
+            "author": "author__username",
+            "group": "group__slug",
+            "text": "text",
+            "pub_date": "pub_date",
+            "image": "image",
+        },
+    },
+    "comments": {
+        "model": Comment,
+        "fields": {
+            "post": "post_id",
+            "author": "author__username",
+            "text": "text",
+            "created": "created",
+        },
+    },
+    "follows": {
+        "model": Follow,
+        "fields": {"user": "user__username", "author": "author__username"},
+    },
+}
+
+
+def export_rows(kind, chunk_size):
+    """Записи одного вида словарями, по chunk_size строк из курсора."""
+    fields = KINDS[kind]["fields"]
+    rows = (
+        KINDS[kind]["model"]
+        .objects.order_by("pk")
+        .values_list(*fields.values())
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield dict(zip(fields, row))
+
+
+def write(output, kinds, file_format, chunk_size):
+    """Пишет записи в output и возвращает генератор прогресса (вид, n)."""
+    if file_format == CSV:
+        (kind,) = kinds
+        writer = csv.DictWriter(output, fieldnames=list(KINDS[kind]["fields"]))
+        writer.writeheader()
+    for kind in kinds:
+        written = 0
+        for row in export_rows(kind, chunk_size):
+            if file_format == CSV:
+                writer.writerow(
+                    {
+                        name: "" if value is None else _text(value)
+                        for name, value in row.items()
+                    }
+                )
+            else:
+                row = {"type": kind, **row}
+                # Не DjangoJSONEncoder: он обрезает время до миллисекунд.
+                output.write(
+                    json.dumps(row, default=_text, ensure_ascii=False)
+                )
+                output.write("\n")
+            written += 1
+            if written % chunk_size == 0:
+                yield kind, written
+        yield kind, written
+
+
+def _text(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def read(source, file_format, kind=None):
+    """Записи (вид, словарь) из NDJSON или CSV одного вида."""
+    if file_format == CSV:
+        for row in csv.DictReader(source):
+            yield kind, row
+        return
+    for line in source:
+        if line.strip():
+            row = json.loads(line)
+            yield row.pop("type"), row
+
+
+class RawInsertQuerySet(models.QuerySet):
+    """
+    bulk_create(), который пишет поля как есть, как loaddata: pre_save()
+    не подставляет текущее время в поля auto_now_add, и даты из выгрузки
+    сохраняются. Сами поля не меняются, поэтому посты, которые
+    параллельно создают пользователи, получают обычную дату.
+    """
+
+    def _insert(self, objs, fields, **kwargs):
+        kwargs["raw"] = True
+        return super()._insert(objs, fields, **kwargs)
+
+
+class Importer:
+    """
+    Загружает записи пачками по batch_size: каждая пачка — один
+    bulk_create в своей транзакции. Авторы и группы ищутся по username
+    и slug одним запросом на пачку, поэтому память не растёт с объёмом.
+    Посты сохраняют исходный id, сдвинутый на post_id_offset, и
+    комментарии находят свой пост тем же сдвигом. Уже существующие
+    пользователи, группы и подписки пропускаются.
+
+    Importer запоминает, чего коснулась загрузка, и refresh() пересобирает
+    производные данные только для этих строк.
+    """
+
+    def __init__(self, batch_size, post_id_offset=0):
+        self.batch_size = batch_size
+        self.post_id_offset = post_id_offset
+        self.kind = None
+        self.batch = []
+        self.imported = dict.fromkeys(KINDS, 0)
+        self.skipped = dict.fromkeys(KINDS, 0)
+        self.post_ids = set()
+        self.user_ids = set()
+        self.author_ids = set()
+        self.group_ids = set()
+        self.commented_ids = set()
+        self.follower_ids = set()
+
+    def run(self, records):
+        """Генератор прогресса: (вид, загружено) после каждой пачки."""
+        for kind, row in records:
+            if kind not in KINDS:
+                raise ValueError(f"Неизвестный вид записи: {kind}")
+            if kind != self.kind or len(self.batch) == self.batch_size:
+                yield from self.flush()
+                self.kind = kind
+            self.batch.append(row)
+        yield from self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        objects = getattr(self, f"build_{self.kind}")(self.batch)
+        model = KINDS[self.kind]["model"]
+        with transaction.atomic():
+            RawInsertQuerySet(model).bulk_create(
+                objects, ignore_conflicts=self.kind != "posts"
+            )
+            getattr(self, f"track_{self.kind}")(objects)
+        self.imported[self.kind] += len(objects)
+        self.skipped[self.kind] += len(self.batch) - len(objects)
+        self.batch = []
+        yield self.kind, self.imported[self.kind]
+
+    @staticmethod
+    def lookup(model, field, values):
+        values = {value for value in values if value}
+        return dict(
+            model.objects.filter(**{f"{field}__in": values}).values_list(
+                field, "pk"
+            )
+        )
+
+    def build_users(self, rows):
+        existing = self.lookup(User, "username", (r["username"] for r in rows))
+        users = {}
+        for row in rows:
+            if row["username"] in existing or row["username"] in users:
+                continue
+            users[row["username"]] = User(
+                username=row["username"],
+                first_name=row.get("first_name") or "",
+                last_name=row.get("last_name") or "",
+                email=row.get("email") or "",
+                date_joined=parse_datetime(row["date_joined"]),
+                password="!",
+            )
+        return list(users.values())
+
+    def track_users(self, users):
+        names = [user.username for user in users]
+        self.user_ids.update(self.lookup(User, "username", names).values())
+
+    def build_groups(self, rows):
+        existing = self.lookup(Group, "slug", (r["slug"] for r in rows))
+        groups = {}
+        for row in rows:
+            if row["slug"] in existing or row["slug"] in groups:
+                continue
+            groups[row["slug"]] = Group(
+                slug=row["slug"],
+                title=row["title"],
+                description=row.get("description") or "",
+            )
+        return list(groups.values())
+
+    def track_groups(self, groups):
+        # У новой группы ещё нет постов: пересчитывать нечего.
+        pass
+
+    def build_posts(self, rows):
+        authors = self.lookup(User, "username", (r["author"] for r in rows))
+        groups = self.lookup(Group, "slug", (r.get("group") for r in rows))
+        return [
+            Post(
+                id=int(row["id"]) + self.post_id_offset,
+                author_id=authors[row["author"]],
+                group_id=groups.get(row.get("group")),
+                text=row["text"],
+                pub_date=parse_datetime(row["pub_date"]),
+                image=row.get("image") or "",
+            )
+            for row in rows
+            if row["author"] in authors
+        ]
+
+    def track_posts(self, posts):
+        for post in posts:
+            self.post_ids.add(post.id)
+            self.author_ids.add(post.author_id)
+            if post.group_id is not None:
+                self.group_ids.add(post.group_id)
+        self.user_ids.update(self.author_ids)
+
+    def build_comments(self, rows):
+        authors = self.lookup(User, "username", (r["author"] for r in rows))
+        post_ids = set(
+            Post.objects.filter(
+                id__in=[int(r["post"]) + self.post_id_offset for r in rows]
+            ).values_list("id", flat=True)
+        )
+        objects = []
+        for row in rows:
+            post_id = int(row["post"]) + self.post_id_offset
+            if row["author"] in authors and post_id in post_ids:
+                objects.append(
+                    Comment(
+                        post_id=post_id,
+                        author_id=authors[row["author"]],
+                        text=row["text"],
+                        created=parse_datetime(row["created"]),
+                    )
+                )
+        return objects
+
+    def track_comments(self, comments):
+        for comment in comments:
+            self.commented_ids.add(comment.post_id)
+            self.user_ids.add(comment.author_id)
+
+    def build_follows(self, rows):
+        users = self.lookup(
+            User,
+            "username",
+            [r["user"] for r in rows] + [r["author"] for r in rows],
+        )
+        pairs = {
+            (users[row["user"]], users[row["author"]])
+            for row in rows
+            if row["user"] in users
+            and row["author"] in users
+            and row["user"] != row["author"]
+        }
+        existing = Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list("user_id", "author_id")
+        return [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs - set(existing)
+        ]
+
+    def track_follows(self, follows):
+        for follow in follows:
+            self.user_ids.update((follow.user_id, follow.author_id))
+            self.follower_ids.add(follow.user_id)
+
+    def refresh(self, log):
+        """
+        bulk_create не шлёт сигналы: пересобирает счётчики, ссылки на
+        картинки, ленты и поисковый индекс загруженных строк.
+        """
+        log("Пересчёт счётчиков...")
+        for user_ids in _chunks(self.user_ids, self.batch_size):
+            counters.recount_users(user_ids)
+        for group_ids in _chunks(self.group_ids, self.batch_size):
+            counters.recount_some(group_ids=group_ids)
+        for post_ids in _chunks(self.commented_ids, self.batch_size):
+            counters.recount_some(post_ids=post_ids)
+        for post_ids in _chunks(self.post_ids, self.batch_size):
+            imagerefs.acquire_posts(post_ids)
+        log("Сборка лент подписок...")
+        follower_ids = set(self.follower_ids)
+        for author_ids in _chunks(self.author_ids, self.batch_size):
+            follower_ids.update(
+                Follow.objects.filter(author_id__in=author_ids).values_list(
+                    "user_id", flat=True
+                )
+            )
+        for user_id in follower_ids:
+            timeline.rebuild(user_id)
+        if search.available():
+            log("Обновление поискового индекса...")
+            for post_ids in _chunks(self.post_ids, self.batch_size):
+                search.index_posts(post_ids)
+        log("Обновление статистики таблиц...")
+        paginators.analyze()
+        bump_posts_version()
+        feeds.bump_scopes(feeds.INDEX_SCOPE)
+
+
+def _chunks(ids, size):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        end = start + size
+        yield ids[start:end]
+
+
+def refresh_derived_data(batch_size, log):
+    """bulk_create не шлёт сигналы: пересобираем производные данные."""
+    log("Пересчёт счётчиков...")
+    counters.recount_all()
+    imagerefs.recount()
+    log("Сборка лент подписок...")
+    followers = Follow.objects.values_list("user_id", flat=True)
+    for user_id in followers.distinct().iterator():
+        timeline.rebuild(user_id)
+    if search.available():
+        log("Построение поискового индекса...")
+        for _ in search.rebuild(batch_size):
+            pass
+    log("Обновление статистики таблиц...")
+    # По статистике ANALYZE постраничный вывод оценивает число строк.
+    paginators.analyze()
+    bump_posts_version()
+    feeds.bump_scopes(feeds.INDEX_SCOPE)
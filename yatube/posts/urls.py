@@ -1,7 +1,7 @@
 # posts/urls.py
 from django.urls import path
 
-from . import views
+from . import api, feeds, sitemaps, views
 
 app_name = "posts"
 
@@ -10,12 +10,14 @@ urlpatterns = [
     path("group/", views.groups, name="groups"),
     path("group/<slug:slug>/", views.group_posts, name="group_list"),
     path("profile/<str:username>/", views.profile, name="profile"),
+    path("search/", views.search, name="search"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
     path("create/", views.post_create, name="post_create"),
     path("posts/<post_id>/edit/", views.post_edit, name="post_edit"),
     path(
         "posts/<int:post_id>/comment/", views.add_comment, name="add_comment"
     ),
+    path("posts/<int:post_id>/comments/", views.comments, name="comments"),
     path("follow/", views.follow_index, name="follow_index"),
     path(
         "profile/<str:username>/follow/",
@@ -27,4 +29,38 @@ urlpatterns = [
         views.profile_unfollow,
         name="profile_unfollow",
     ),
+    path("feed/", feeds.feed_view(feeds.PostsFeed), name="feed"),
+    path("feed/atom/", feeds.feed_view(feeds.AtomPostsFeed), name="feed_atom"),
+    path(
+        "group/<slug:slug>/feed/",
+        feeds.feed_view(feeds.GroupFeed),
+        name="group_feed",
+    ),
+    path(
+        "group/<slug:slug>/feed/atom/",
+        feeds.feed_view(feeds.AtomGroupFeed),
+        name="group_feed_atom",
+    ),
+    path(
+        "profile/<str:username>/feed/",
+        feeds.feed_view(feeds.ProfileFeed),
+        name="profile_feed",
+    ),
+    path(
+        "profile/<str:username>/feed/atom/",
+        feeds.feed_view(feeds.AtomProfileFeed),
+        name="profile_feed_atom",
+    ),
+    path("sitemap.xml", sitemaps.serve, name="sitemap_index"),
+    path(
+        "sitemap-<slug:section>-<int:shard>.xml",
+        sitemaps.serve,
+        name="sitemap",
+    ),
+    path("api/posts/", api.index, name="api_index"),
+    path("api/posts/export/", api.export, name="api_export"),
+    path("api/posts/<int:post_id>/", api.post_detail, name="api_post_detail"),
+    path("api/group/<slug:slug>/", api.group_posts, name="api_group_list"),
+    path("api/profile/<str:username>/", api.profile, name="api_profile"),
+    path("api/follow/", api.follow_index, name="api_follow_index"),
 ]
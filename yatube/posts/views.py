@@ -1,31 +1,139 @@
 # posts/views.py
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
-from django.core.paginator import Paginator
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
 
+from .caching import get_or_set_page, page_key, posts_version
+from .conditional import conditional, make_etag
+from .counters import user_stats
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-
-
-def pagin(request, database_query, posts_on_page=settings.POSTS_ON_PAGE):
-    paginator = Paginator(database_query, posts_on_page)
+from .models import Comment, Follow, Group, Post, User
+from .paginators import CursorPaginator, EstimatedCountPaginator
+from .search import search as search_posts
+from .timeline import feed_version, is_following, timeline
+
+
+def pagin(
+    request,
+    database_query,
+    posts_on_page=settings.POSTS_ON_PAGE,
+    keyset=None,
+    cache_count=True,
+):
+    if keyset is None:
+        keyset = settings.POSTS_KEYSET_PAGINATION or "cursor" in request.GET
+    if keyset:
+        paginator = CursorPaginator(database_query, posts_on_page)
+        return paginator.get_page(request.GET.get("cursor"))
+    # Число постов меняется вместе с версией лент; ленту подписок
+    # меняют ещё и подписки, её считаем точно.
+    paginator = EstimatedCountPaginator(
+        database_query,
+        posts_on_page,
+        version=posts_version() if cache_count else None,
+    )
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
+def feed_validators(request, database_query, *parts):
+    """
+    Валидаторы ленты: номера и версии постов видимой страницы.
+
+    Last-Modified не отдаётся: правка поста не двигает ни дату
+    публикации, ни дату комментариев, и по If-Modified-Since клиент
+    получил бы 304 со старой страницей. Свежесть проверяет ETag.
+    """
+    # pub_date нужен курсорной пагинации.
+    page_obj = pagin(
+        request, database_query.values("id", "version", "pub_date")
+    )
+    visible = [(row["id"], row["version"]) for row in page_obj.object_list]
+    return make_etag(request, visible, *parts), None
+
+
+def index_validators(request):
+    # Главная и так кэшируется по версии постов: её ключ и есть ETag.
+    return make_etag(request, page_key("index", request)), None
+
+
+def group_validators(request, slug):
+    group = (
+        Group.objects.filter(slug=slug)
+        .values_list("id", "title", "description", "posts_count")
+        .first()
+    )
+    if group is None:
+        return None, None
+    return feed_validators(
+        request, Post.objects.filter(group_id=group[0]), group
+    )
+
+
+def profile_validators(request, username):
+    author = (
+        User.objects.filter(username=username)
+        .annotate(
+            is_followed=Exists(
+                Follow.objects.filter(
+                    user_id=request.user.pk, author=OuterRef("pk")
+                )
+            )
+        )
+        .values_list(
+            "id",
+            "first_name",
+            "last_name",
+            "stats__posts_count",
+            "stats__followers_count",
+            "stats__following_count",
+            "is_followed",
+        )
+        .first()
+    )
+    if author is None:
+        return None, None
+    return feed_validators(
+        request, Post.objects.filter(author_id=author[0]), author
+    )
+
+
+def post_detail_validators(request, post_id):
+    # Без Last-Modified по той же причине, что и в feed_validators.
+    post = (
+        Post.objects.filter(pk=post_id)
+        .values_list("version", "comments_count", "author__stats__posts_count")
+        .first()
+    )
+    if post is None:
+        return None, None
+    # Первая страница комментариев: в ней видны имена их авторов.
+    comments = (
+        Comment.objects.filter(post_id=post_id)
+        .order_by("-created", "-id")
+        .values_list("id", "author__username")[: settings.COMMENTS_ON_PAGE]
+    )
+    # В форме комментария CSRF-токен: после нового входа он другой, и
+    # форма со страницы из кэша браузера не прошла бы проверку.
+    csrf_secret = request.META.get("CSRF_COOKIE")
+    return make_etag(request, post, list(comments), csrf_secret), None
+
+
+@conditional(index_validators)
 def index(request):
     template = "posts/index.html"
     title = "Последние обновления на сайте"
 
-    database_query = cache.get_or_set(
-        "index_post_list",
-        Post.objects.select_related("author", "group").all(),
-        20,
+    page_obj = get_or_set_page(
+        "index",
+        request,
+        lambda: pagin(
+            request, Post.objects.select_related("author", "group").all()
+        ),
     )
-    page_obj = pagin(request, database_query)
 
     context = {
         "title": title,
@@ -37,7 +145,7 @@ def index(request):
 def groups(request):
     template = "posts/groups.html"
     title = "Группы"
-    page_obj = pagin(request, Group.objects.all())
+    page_obj = pagin(request, Group.objects.all(), keyset=False)
 
     context = {
         "title": title,
@@ -46,6 +154,7 @@ def groups(request):
     return render(request, template, context)
 
 
+@conditional(group_validators)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
 
@@ -61,10 +170,12 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional(profile_validators)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    posts_count = post_list.count()
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    stats = user_stats(author)
 
     template = "posts/profile.html"
     title = f"Профайл пользователя {author.get_full_name}"
@@ -72,29 +183,31 @@ def profile(request, username):
 
     following = None
     if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
+        following = is_following(request.user, author.pk)
 
     context = {
         "title": title,
         "author": author,
         "page_obj": page_obj,
-        "posts_count": posts_count,
+        "posts_count": stats.posts_count,
+        "stats": stats,
         "following": following,
     }
     return render(request, template, context)
 
 
+@conditional(post_detail_validators)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post.objects.select_related(), pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), pk=post_id
+    )
 
     template = "posts/post_detail.html"
     title = f"{post.text[:30]}"
 
-    posts_count = post.author.posts.count()
+    posts_count = user_stats(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comments_page(post)
 
     context = {
         "title": title,
@@ -106,6 +219,43 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+def search(request):
+    template = "posts/search.html"
+    query = request.GET.get("q", "").strip()
+    title = f"Поиск: {query}" if query else "Поиск"
+
+    page_obj = None
+    if query:
+        page_obj = pagin(request, search_posts(query), keyset=False)
+
+    context = {
+        "title": title,
+        "query": query,
+        "page_obj": page_obj,
+        "extra_query": f"&{urlencode({'q': query})}",
+    }
+    return render(request, template, context)
+
+
+def comments_page(post, cursor=None):
+    paginator = CursorPaginator(
+        post.comments.select_related("author"),
+        settings.COMMENTS_ON_PAGE,
+        ordering=("-created", "-id"),
+    )
+    return paginator.get_page(cursor)
+
+
+def comments(request, post_id):
+    post = get_object_or_404(Post.objects.only("id"), pk=post_id)
+    template = "posts/includes/comments.html"
+    context = {
+        "post": post,
+        "comments": comments_page(post, request.GET.get("cursor")),
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     template = "posts/post_create.html"
@@ -162,8 +312,15 @@ def add_comment(request, post_id):
 def follow_index(request):
     template = "posts/index.html"
     title = "Новости"
-    page_obj = pagin(
-        request, Post.objects.filter(author__following__user=request.user)
+    page_obj = get_or_set_page(
+        f"follow:{request.user.pk}",
+        request,
+        lambda: pagin(
+            request,
+            timeline(request.user).select_related("author", "group"),
+            cache_count=False,
+        ),
+        data_version=feed_version(request.user),
     )
     context = {
         "title": title,
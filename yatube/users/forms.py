@@ -1,6 +1,10 @@
 # users/forms.py
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+
+from core.tasks import enqueue
+
+from .tasks import send_password_reset
 
 User = get_user_model()
 
@@ -9,3 +13,36 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """
+    Письмо отправляет очередь задач. В задачу уходят только пользователь,
+    адрес и шаблоны: ссылку с токеном собирает обработчик.
+    """
+
+    def send_mail(
+        self,
+        subject_template_name,
+        email_template_name,
+        context,
+        from_email,
+        to_email,
+        html_email_template_name=None,
+    ):
+        site = {
+            name: context[name] for name in ("domain", "site_name", "protocol")
+        }
+        templates = {
+            "subject": subject_template_name,
+            "email": email_template_name,
+            "html": html_email_template_name,
+        }
+        enqueue(
+            send_password_reset,
+            context["user"].pk,
+            to_email,
+            site,
+            templates,
+            from_email,
+        )
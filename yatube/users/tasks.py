@@ -0,0 +1,44 @@
+# users/tasks.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMultiAlternatives
+from django.template import loader
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.tasks import task
+
+User = get_user_model()
+
+
+@task
+def send_email(subject, body, from_email, to, html_body=None):
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html_body is not None:
+        message.attach_alternative(html_body, "text/html")
+    message.send()
+
+
+@task
+def send_password_reset(user_id, to_email, site, templates, from_email=None):
+    """
+    Письмо сброса пароля. Токен подписывается и письмо собирается здесь:
+    аргументы задачи лежат в таблице открытым текстом, ссылки в них нет.
+    """
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return
+    context = {
+        "email": to_email,
+        "user": user,
+        "uid": urlsafe_base64_encode(force_bytes(user.pk)),
+        "token": default_token_generator.make_token(user),
+        **site,
+    }
+    subject = loader.render_to_string(templates["subject"], context)
+    subject = "".join(subject.splitlines())
+    body = loader.render_to_string(templates["email"], context)
+    html_body = None
+    if templates["html"] is not None:
+        html_body = loader.render_to_string(templates["html"], context)
+    send_email(subject, body, from_email, [to_email], html_body)
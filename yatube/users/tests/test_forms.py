@@ -1,8 +1,15 @@
 # users/tests/test_forms.py
+import json
+import re
+
 from django.contrib.auth import get_user_model
+from django.core import mail
 from django.test import TestCase
 from django.urls import reverse
 
+from core import tasks
+from core.models import Task
+
 User = get_user_model()
 
 
@@ -20,3 +27,30 @@ class CreationFormTests(TestCase):
         )
         self.assertRedirects(response, reverse("posts:index"))
         self.assertEqual(User.objects.count(), users_count + 1)
+
+
+class PasswordResetFormTests(TestCase):
+    def test_reset_email_is_sent_by_queue(self):
+        """Письмо сброса пароля уходит из очереди, а не в запросе."""
+        user = User.objects.create_user(
+            username="user", email="user@example.com", password="pass"
+        )
+        response = self.client.post(
+            reverse("users:password_reset_form"),
+            {"email": "user@example.com"},
+        )
+        self.assertRedirects(response, reverse("users:password_reset_done"))
+        self.assertEqual(len(mail.outbox), 0)
+        task_obj = Task.objects.get()
+        # В таблице задач нет ссылки с токеном — только адресат.
+        self.assertEqual(
+            json.loads(task_obj.arguments)[:2], [user.pk, "user@example.com"]
+        )
+        self.assertNotIn("/auth/reset/", task_obj.arguments)
+
+        self.assertEqual(tasks.run_pending(), [True])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["user@example.com"])
+        link = re.search(r"http://\S+/auth/reset/\S+/", mail.outbox[0].body)
+        response = self.client.get(link.group())
+        self.assertEqual(response.status_code, 302, "Ссылка действительна.")
@@ -17,12 +17,99 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 POSTS_ON_PAGE = 10
-
+COMMENTS_ON_PAGE = 20
+# Пагинация лент по курсору (pub_date, id) вместо номеров страниц.
+# Включается и для отдельного запроса параметром ?cursor=.
+POSTS_KEYSET_PAGINATION = False
+# Таблицы от стольких строк (по статистике ANALYZE) постраничный вывод
+# не пересчитывает COUNT(*), а берёт оценку. Точные числа кэшируются.
+PAGINATOR_EXACT_THRESHOLD = 10000
+PAGINATOR_COUNT_TIMEOUT = 60 * 5
+# Глубина материализованной ленты подписок на пользователя.
+TIMELINE_DEPTH = 500
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Страницы ленты кэшируются с версией постов, которая сбрасывается
+# сигналами при любых изменениях, поэтому срок жизни может быть долгим.
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 15
+# Отрисованная карточка поста живёт, пока не изменится версия поста.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# RSS/Atom: число записей в ленте и срок жизни готового XML.
+FEED_ITEMS = 20
+FEED_CACHE_TIMEOUT = 60 * 60
+# Карты сайта строит команда build_sitemaps; в шарде не больше
+# SITEMAP_SHARD_SIZE первичных ключей (лимит протокола — 50 000 адресов).
+SITEMAP_ROOT = os.path.join(BASE_DIR, "sitemaps")
+SITEMAP_SHARD_SIZE = 50000
+SITEMAP_BASE_URL = "http://localhost:8000"
+# Миниатюры картинок постов готовит обработчик очереди задач:
+# имя -> (геометрия sorl, параметры).
+POST_THUMBNAILS = {
+    "card": ("960x339", {"crop": "center", "upscale": True}),
+}
+# Загруженные картинки: больше MAX_BYTES или MAX_PIXELS отклоняются по
+# заголовку файла, остальные уменьшаются до MAX_SIZE и пересжимаются.
+POST_IMAGE_MAX_BYTES = 20 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 50_000_000
+# Анимация: не больше MAX_FRAMES кадров и ANIMATION_PIXELS пикселей во
+# всех кадрах вместе; кадры уменьшаются и пересжимаются, как картинки.
+POST_IMAGE_MAX_FRAMES = 300
+POST_IMAGE_MAX_ANIMATION_PIXELS = 50_000_000
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_QUALITY = 85
+# Сколько секунд collect_images не трогает файл, оставшийся без ссылок.
+IMAGE_GC_GRACE = 60 * 60
+# Очередь задач (core.tasks): задачи выполняет manage.py run_worker.
+# TASKS_EAGER выполняет их сразу после коммита в том же процессе. В
+# тестах задачи остаются в очереди: тест, которому нужен результат,
+# вызывает задачу сам или core.tasks.run_pending().
+TASKS_EAGER = False
+TASKS_MAX_ATTEMPTS = 5
+# Пауза перед повтором: TASKS_BACKOFF * 2^(попытка - 1), не больше MAX.
+TASKS_BACKOFF = 10
+TASKS_BACKOFF_MAX = 60 * 60
+# Через сколько секунд задача упавшего обработчика снова свободна.
+TASKS_LEASE = 60 * 10
+# Периодические задачи: путь -> интервал в секундах. run_worker ставит
+# их в очередь при запуске, а выполненную — снова через интервал.
+TASKS_PERIODIC = {
+    # Статистика, по которой постраничный вывод оценивает число строк.
+    "posts.paginators.analyze": 60 * 60,
+}
+# Замеры запросов по представлениям: размер кольцевого буфера на
+# представление, как часто публиковать их в кэш для metrics_report
+# и бюджеты вида {"posts:index": {"queries": 10, "wall_ms": 200}}.
+# Запросы к кэшу в таблице core.CacheEntry идут в cache_queries и
+# cache_ms, а не в queries и sql_ms.
+METRICS_ENABLED = True
+METRICS_BUFFER_SIZE = 1000
+METRICS_PUBLISH_EVERY = 100
+METRICS_BUDGETS = {}
+
+# Горячие ключи читаются из памяти процесса (core.cache_backends), всё
+# остальное — из общего для обработчиков кэша в таблице основной базы:
+# в нём add() и incr() атомарны.
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    }
+        "BACKEND": "core.cache_backends.TwoTierCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            "LOCAL_TIMEOUT": 5,
+            "BROADCAST_INTERVAL": 1,
+            "MAX_ENTRIES": 1000,
+        },
+    },
+    "shared": {
+        "BACKEND": "core.cache_backends.AtomicDatabaseCache",
+        "LOCATION": "default",
+        "OPTIONS": {"MAX_ENTRIES": 100_000},
+    },
 }
+# core.stampede: сколько истёкшее значение ещё отдаётся, пока один
+# запрос его пересчитывает, и сколько держится блокировка пересчёта.
+CACHE_STALE_TIMEOUT = 60
+CACHE_LOCK_TIMEOUT = 10
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -67,6 +154,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.RequestMetricsMiddleware",
+    "core.middleware.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -93,7 +182,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.template_backends.MeteredDjangoTemplates",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -126,6 +215,18 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения — алиасы из DATABASES. Локально реплику можно
+# изобразить копией файла SQLite:
+#     DATABASES["replica"] = {
+#         "ENGINE": "django.db.backends.sqlite3",
+#         "NAME": os.path.join(BASE_DIR, "db.replica.sqlite3"),
+#     }
+#     DATABASE_REPLICAS = ["replica"]
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -8,6 +8,7 @@ urlpatterns = [
     path("about/", include("about.urls", namespace="about")),
     path("auth/", include("users.urls", namespace="users")),
     path("admin/", admin.site.urls),
+    path("metrics/", include("core.urls", namespace="core")),
     path("auth/", include("django.contrib.auth.urls")),
 ]
 